@@ -0,0 +1,64 @@
+#!/usr/bin/python
+"""
+Time loading, serializing and re-serializing a large Eucalyptus config: a topology of --clusters clusters holding
+--nodes node controllers between them, 10k by default.
+
+    PYTHONPATH=. python benchmarks/config_manager_load.py --nodes 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from config_manager.eucalyptus import Eucalyptus
+from config_manager.eucalyptus.loader import load_file, loads
+
+
+def build(clusters, nodes):
+    eucalyptus = Eucalyptus()
+    eucalyptus.set_log_level('INFO')
+    topology = eucalyptus.create_topology()
+    per_cluster = nodes // clusters
+    for number in range(clusters):
+        cluster = topology.create_cluster('cluster{0}'.format(number), hypervisor='kvm')
+        cluster.blockstorage_type.value = 'overlay'
+        cluster.create_block_storage().create_storage_controller('sc{0}'.format(number))
+        cluster.create_cluster_controller('cc{0}'.format(number))
+        cluster.eucalyptus_properties.vnetsubnet.value = '10.{0}.0.0'.format(number)
+        for host in range(per_cluster):
+            node = cluster.create_node('10.{0}.{1}.{2}'.format(number, host // 250, host % 250 + 1))
+            node.max_cores.value = 32
+    return eucalyptus
+
+
+def timed(name, function, *args):
+    started = time.time()
+    result = function(*args)
+    print "{0:<32} {1:>10.1f}".format(name, (time.time() - started) * 1000)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark config_manager loading and serialization.')
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--clusters', type=int, default=10)
+    args = parser.parse_args()
+
+    print "{0:<32} {1:>10}".format('step', 'ms')
+    eucalyptus = timed('build objects', build, args.clusters, args.nodes)
+    text = timed('to_json (cold)', eucalyptus.to_json)
+    timed('to_json (cached)', eucalyptus.to_json)
+    cluster = eucalyptus.topology.value.get_cluster('cluster0')
+    cluster.get_node('10.0.0.1').max_cores.value = 16
+    timed('to_json (after one change)', eucalyptus.to_json)
+
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as config_file:
+        config_file.write(text)
+    try:
+        loaded = timed('load_file', load_file, path)
+        timed('loads', loads, text)
+        timed('update_from_file', loaded.update_from_file, path)
+    finally:
+        os.remove(path)
+    assert loaded.to_json() == text
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+"""
+Query latency of the resource manager lookups with and without the indexes declared in api_config.
+
+Runs against a local mongod when one answers on --mongo-url, otherwise against mongomock. mongomock scans its
+collections whatever indexes exist, so only a real mongod shows the difference between the two runs.
+
+    PYTHONPATH=. python benchmarks/resource_manager_indexes.py --documents 100000
+"""
+import argparse
+import time
+
+import pymongo
+from pymongo.errors import ServerSelectionTimeoutError
+
+from resource_manager.api_config import ResourceSchema
+from resource_manager.operations import ensure_indexes
+
+QUERIES = [('hostname', {'hostname': 'host-54321'}),
+           ('state', {'state': 'idle'}),
+           ('state+owner', {'state': 'in_use', 'owner': 'owner-7'}),
+           ('owner', {'owner': 'owner-42'}),
+           ('job_id', {'job_id': 'job-1234'})]
+
+
+def connect(url):
+    client = pymongo.MongoClient(url, serverSelectionTimeoutMS=1000)
+    try:
+        client.server_info()
+        return client, 'mongod at ' + url
+    except ServerSelectionTimeoutError:
+        import mongomock
+        return mongomock.MongoClient(), 'mongomock (no mongod at ' + url + ')'
+
+
+def populate(collection, count):
+    states = ResourceSchema.machine_schema['state']['allowed']
+    batch = []
+    for i in range(count):
+        batch.append({'hostname': 'host-' + str(i), 'state': states[i % len(states)],
+                      'owner': 'owner-' + str(i % 100), 'job_id': 'job-' + str(i % 5000)})
+        if len(batch) == 1000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def time_queries(collection, repeat):
+    timings = {}
+    for name, query in QUERIES:
+        started = time.time()
+        for _ in range(repeat):
+            list(collection.find(query, {'_id': 1}))
+        timings[name] = (time.time() - started) / repeat * 1000
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark resource manager queries with and without indexes.')
+    parser.add_argument('--mongo-url', default='mongodb://127.0.0.1:27017')
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    client, backend = connect(args.mongo_url)
+    db = client['resource_manager_benchmark']
+    db.drop_collection('machines')
+    print "Loading {0} machines into {1}".format(args.documents, backend)
+    populate(db.machines, args.documents)
+
+    unindexed = time_queries(db.machines, args.repeat)
+    ensure_indexes(db, {'machines': ResourceSchema.machine_indexes})
+    indexed = time_queries(db.machines, args.repeat)
+
+    print "{0:<12} {1:>14} {2:>14}".format('query', 'scan (ms)', 'indexed (ms)')
+    for name, _ in QUERIES:
+        print "{0:<12} {1:>14.2f} {2:>14.2f}".format(name, unindexed[name], indexed[name])
+    client.drop_database('resource_manager_benchmark')
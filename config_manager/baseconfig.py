@@ -86,6 +86,118 @@ class ConfigProperty(object):
                                                  val_str)
 
 
+class NamedConfigList(object):
+    """
+    Ordered collection of config objects (ie: nodes, storage controllers)
+    indexed by their name.value. Lookup, add and delete are O(1) and
+    iteration keeps insertion order for the json output.
+    Objects are indexed by the name they had when added.
+    """
+
+    def __init__(self, items=None):
+        self._items = []
+        self._positions = {}
+        self._deleted = 0
+        self._owner = None
+        if items:
+            self.extend(items)
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        Validate callback for properties holding a NamedConfigList, wraps
+        plain lists of config objects.
+        """
+        if value is None:
+            return cls()
+        if isinstance(value, cls):
+            return value
+        if not isinstance(value, list):
+            value = [value]
+        return cls(value)
+
+    @staticmethod
+    def _get_name(item):
+        if not isinstance(item, BaseConfig):
+            raise ValueError('Can not add obj of non-config type:{0}, obj:{1}'
+                             .format(type(item), item))
+        return item.name.value
+
+    def add(self, item):
+        self.extend([item])
+
+    def extend(self, items):
+        """
+        Adds items in order. Nothing is added if any name is already in use
+        or given twice.
+        """
+        names = [self._get_name(item) for item in items]
+        seen = set()
+        for name in names:
+            if name in self._positions or name in seen:
+                raise ValueError('Config with name:"{0}" already exists'.format(name))
+            seen.add(name)
+        for name, item in zip(names, items):
+            self._positions[name] = len(self._items)
+            self._items.append((name, item))
+            if self._owner is not None:
+                item._add_config_parent(self._owner)
+        if items and self._owner is not None:
+            self._owner.mark_dirty()
+
+    def get(self, name, default=None):
+        position = self._positions.get(name)
+        if position is None:
+            return default
+        return self._items[position][1]
+
+    def remove(self, name):
+        """
+        :returns the removed object or None if there was none by that name
+        """
+        position = self._positions.pop(name, None)
+        if position is None:
+            return None
+        item = self._items[position][1]
+        # Leave a hole instead of shifting the list, compact once holes dominate
+        self._items[position] = None
+        self._deleted += 1
+        if self._deleted * 2 > len(self._items):
+            self._compact()
+        if self._owner is not None:
+            item._remove_config_parent(self._owner)
+            self._owner.mark_dirty()
+        return item
+
+    def _compact(self):
+        self._items = [entry for entry in self._items if entry is not None]
+        self._positions = dict((entry[0], position) for position, entry in enumerate(self._items))
+        self._deleted = 0
+
+    def names(self):
+        return [entry[0] for entry in self._items if entry is not None]
+
+    def to_list(self):
+        return [entry[1] for entry in self._items if entry is not None]
+
+    def __iter__(self):
+        return (entry[1] for entry in self._items if entry is not None)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def _set_owner(self, owner):
+        self._owner = owner
+        for item in self:
+            item._add_config_parent(owner)
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, self.names())
+
+
 class BaseConfig(object):
     """
     Intention of this class is to provide utilities around reading and writing
@@ -136,6 +248,7 @@ class BaseConfig(object):
     def eucalyptus_properties(self):
         if not hasattr(self, '_eucalyptus_properties'):
             self._eucalyptus_properties = EucalyptusProperties()
+            self._eucalyptus_properties._owner = self
         assert isinstance(self._eucalyptus_properties, EucalyptusProperties)
         return self._eucalyptus_properties
 
@@ -145,6 +258,135 @@ class BaseConfig(object):
             self._json_properties = {}
         return self._json_properties
 
+    @property
+    def config_parents(self):
+        """
+        Config objects holding this one in one of their properties
+        """
+        if not hasattr(self, '_config_parents'):
+            self._config_parents = []
+        return self._config_parents
+
+    @property
+    def json_cache(self):
+        """
+        Serialized json fragments of this object, emptied whenever this
+        object or one below it changes
+        """
+        if not hasattr(self, '_json_cache'):
+            self._json_cache = {}
+        return self._json_cache
+
+    def mark_dirty(self):
+        """
+        Drops the cached json of this object and of every parent up the tree.
+        Called on property writes, call it after changing a property's value
+        in place (ie: appending to a list value).
+        """
+        if not self.json_cache:
+            # Whenever the cache here was filled, the parents were rendered
+            # after it, so empty here means empty all the way up
+            return
+        self.json_cache.clear()
+        for parent in self.config_parents:
+            parent.mark_dirty()
+
+    @property
+    def eucalyptus_property_index(self):
+        """
+        Flat index of property string -> EucalyptusProperty for this object
+        and every config object below it. Kept up to date as properties are
+        created and children are attached or detached.
+        """
+        if not hasattr(self, '_eucalyptus_property_index'):
+            self._eucalyptus_property_index = {}
+        return self._eucalyptus_property_index
+
+    @property
+    def _eucalyptus_property_values(self):
+        """
+        Values of the indexed properties, keyed by show_all: all of them, or
+        only those which are set
+        """
+        if not hasattr(self, '_eucalyptus_values'):
+            self._eucalyptus_values = {True: {}, False: {}}
+        return self._eucalyptus_values
+
+    def _index_eucalyptus_properties(self, properties):
+        """
+        Adds properties (dict of property string -> EucalyptusProperty) to
+        the index of this object and of every parent up the tree
+        """
+        if not properties:
+            return
+        self.eucalyptus_property_index.update(properties)
+        for prop in properties.values():
+            self._store_eucalyptus_value(prop)
+        for parent in self.config_parents:
+            parent._index_eucalyptus_properties(properties)
+
+    def _unindex_eucalyptus_properties(self, properties):
+        if not properties:
+            return
+        index = self.eucalyptus_property_index
+        values = self._eucalyptus_property_values
+        for property_string, prop in properties.items():
+            if index.get(property_string) is prop:
+                del index[property_string]
+                values[True].pop(property_string, None)
+                values[False].pop(property_string, None)
+        for parent in self.config_parents:
+            parent._unindex_eucalyptus_properties(properties)
+
+    def _eucalyptus_property_changed(self, prop):
+        if self.eucalyptus_property_index.get(prop.name) is not prop:
+            return
+        self._store_eucalyptus_value(prop)
+        for parent in self.config_parents:
+            parent._eucalyptus_property_changed(prop)
+
+    def _store_eucalyptus_value(self, prop):
+        values = self._eucalyptus_property_values
+        values[True][prop.name] = prop.value
+        if prop.value is not None:
+            values[False][prop.name] = prop.value
+        else:
+            values[False].pop(prop.name, None)
+
+    def _add_config_parent(self, parent):
+        if not any(existing is parent for existing in self.config_parents):
+            self.config_parents.append(parent)
+            parent._index_eucalyptus_properties(dict(self.eucalyptus_property_index))
+
+    def _remove_config_parent(self, parent):
+        if any(existing is parent for existing in self.config_parents):
+            self._config_parents = [existing for existing in self.config_parents
+                                    if existing is not parent]
+            parent._unindex_eucalyptus_properties(dict(self.eucalyptus_property_index))
+
+    def _link_value(self, value, link=True):
+        """
+        Registers (or unregisters) this object as parent of config objects
+        held in a property value
+        """
+        if isinstance(value, BaseConfig):
+            children = [value]
+        elif isinstance(value, NamedConfigList):
+            if link:
+                value._set_owner(self)
+            children = value
+        elif isinstance(value, dict):
+            children = [child for child in value.values() if isinstance(child, BaseConfig)]
+        elif isinstance(value, list):
+            children = [child for child in value if isinstance(child, BaseConfig)]
+        else:
+            return
+        for child in children:
+            if link:
+                child._add_config_parent(self)
+            else:
+                child._remove_config_parent(self)
+
     def __setattr__(self, key, value, force=False):
         attr = getattr(self, key, None)
         if attr and (isinstance(attr, ConfigProperty) or isinstance(attr, EucalyptusProperty)) \
@@ -155,14 +397,25 @@ class BaseConfig(object):
         else:
             self.__dict__[key] = value
 
+    @property
+    def json_name_index(self):
+        """
+        Index of json name -> ConfigProperty, filled by create_property()
+        """
+        if not hasattr(self, '_json_name_index'):
+            self._json_name_index = {}
+        return self._json_name_index
+
     def create_property(self, json_name, value=None, validate_callback=None,
                         reset_callback=None, default_value=None):
-        return ConfigProperty(json_name=json_name,
-                              configmanager=self,
-                              value=value,
-                              validate_callback=validate_callback,
-                              reset_callback=reset_callback,
-                              default_value=default_value)
+        config_property = ConfigProperty(json_name=json_name,
+                                         configmanager=self,
+                                         value=value,
+                                         validate_callback=validate_callback,
+                                         reset_callback=reset_callback,
+                                         default_value=default_value)
+        self.json_name_index[json_name] = config_property
+        return config_property
 
     def _get_json_property(self, property_name):
         """
@@ -174,14 +427,19 @@ class BaseConfig(object):
         """
         helper method for mapping json to python properties
         """
+        if property_name in self.json_properties:
+            self._link_value(self.json_properties[property_name], link=False)
         self.json_properties[property_name] = value
+        self._link_value(value)
+        self.mark_dirty()
 
     def _del_json_property(self, property_name):
         """
         helper method for mapping json to python properties
         """
         if property_name in self.json_properties:
-            self.json_properties.pop(property_name)
+            self._link_value(self.json_properties.pop(property_name), link=False)
+            self.mark_dirty()
 
     def __repr__(self):
         """
@@ -191,12 +449,7 @@ class BaseConfig(object):
         return self.to_json(show_all=True)
 
     def get_attr_by_json_name(self, json_name):
-        for key in self._get_keys():
-            attr = getattr(self, key)
-            if isinstance(attr, ConfigProperty):
-                if attr.name == json_name:
-                    return attr
-        return None
+        return self.json_name_index.get(json_name)
 
     # todo define how validation methods for each config subclass should be used
     def validate(self):
@@ -218,6 +471,8 @@ class BaseConfig(object):
         new_dict = copy.copy(json_dict)
         assert isinstance(json_dict, dict)
         for key in json_dict:
+            if isinstance(json_dict[key], NamedConfigList):
+                new_dict[key] = json_dict[key].to_list()
             if not json_dict[key]:
                 if not show_all:
                     new_dict.__delitem__(key)
@@ -228,15 +483,23 @@ class BaseConfig(object):
 
     def to_json(self, show_all=False, **kwargs):
         """
-        converts the local dict '_json_properties{} to json
+        converts the local dict '_json_properties{} to json. The output is
+        the same as json.dumps(sort_keys=True, indent=4), but each config
+        object's fragment is cached until it or one below it changes, so
+        only the changed path is rendered again.
         """
-        return json.dumps(self,
-                          default=lambda o: o._process_json_output(
-                              json_dict=o._json_properties,
-                              show_all=show_all,
-                              **kwargs),
-                          sort_keys=True,
-                          indent=4)
+        return self._render_json(0, show_all, kwargs)
+
+    def _render_json(self, level, show_all, kwargs):
+        key = (level, show_all, tuple(sorted(kwargs.items())))
+        fragment = self.json_cache.get(key)
+        if fragment is None:
+            json_dict = self._process_json_output(json_dict=self.json_properties,
+                                                  show_all=show_all,
+                                                  **kwargs)
+            fragment = _render_json_value(json_dict, level, show_all, kwargs)
+            self.json_cache[key] = fragment
+        return fragment
 
     def _get_formatted_conf(self):
         return pformat(vars(self))
@@ -273,18 +536,68 @@ class BaseConfig(object):
             return
         newdict = self._get_dict_from_file(file_path=file_path)
         if newdict:
-            for key in newdict:
-                value = newdict[key]
-                if key not in self.json_properties:
-                    print ('warning "{0}" not found in json properties for '
-                           'class: "{1}"'.format(key, self.__class__))
+            self.update_from_dict(newdict)
+
+    def update_from_dict(self, newdict):
+        """
+        Sets values from a dict as read from a json config in one pass.
+        Nested dicts for properties holding config objects (or dicts and
+        named lists of them) are handed down to those objects rather than
+        assigned as plain dicts. An 'eucalyptus_properties' dict is applied
+        to the properties found in the tree below this object.
+        """
+        eucalyptus_properties = None
+        for key in newdict:
+            value = newdict[key]
+            if key == 'eucalyptus_properties' and key not in self.json_properties:
+                # Applied last, the objects holding them may be among the other values
+                eucalyptus_properties = value
+            elif key not in self.json_properties:
+                print ('warning "{0}" not found in json properties for '
+                       'class: "{1}"'.format(key, self.__class__))
+            else:
+                attr = self.get_attr_by_json_name(key)
+                if not attr:
+                    print 'warning local attribute with json_name "{0}" ' \
+                          'not found'.format(key)
                 else:
-                    attr = self.get_attr_by_json_name(key)
-                    if not attr:
-                        print 'warning local attribute with json_name "{0}" ' \
-                              'not found'.format(key)
-                    else:
-                        attr.value = value
+                    self._update_property_from_value(attr, value)
+        if eucalyptus_properties:
+            self._update_eucalyptus_properties(eucalyptus_properties)
+
+    def _update_property_from_value(self, attr, value):
+        current = attr.value
+        if isinstance(value, dict) and isinstance(current, BaseConfig):
+            current.update_from_dict(value)
+        elif isinstance(value, dict) and isinstance(current, dict) and \
+                all(isinstance(item, dict) for item in value.values()):
+            for name in value:
+                child = current.get(name)
+                if isinstance(child, BaseConfig):
+                    child.update_from_dict(value[name])
+                else:
+                    print 'warning no config object named "{0}" in "{1}" to update' \
+                          .format(name, attr.name)
+        elif isinstance(value, list) and isinstance(current, NamedConfigList) and \
+                all(isinstance(item, dict) for item in value):
+            for item in value:
+                child = current.get(item.get('name'))
+                if child is None:
+                    print 'warning no config object named "{0}" in "{1}" to update' \
+                          .format(item.get('name'), attr.name)
+                else:
+                    child.update_from_dict(item)
+        else:
+            attr.value = value
+
+    def _update_eucalyptus_properties(self, values):
+        index = self.eucalyptus_property_index
+        for property_string in values:
+            prop = index.get(property_string)
+            if prop is None:
+                print 'warning eucalyptus property "{0}" not found'.format(property_string)
+            elif prop.value != values[property_string]:
+                prop.value = values[property_string]
 
     # todo define how/if this method should be used, examples, etc..
     def send(self, filehandle=None):
@@ -353,13 +666,30 @@ class BaseConfig(object):
     def _aggregate_eucalyptus_properties(self, show_all=False):
         """
         Gathers all the eucalyptus software specific properties for child
-        baseconfig object
+        baseconfig object. Read from the maintained index, no tree walk.
         :returns dict
         """
-        property_dict = self.eucalyptus_properties.get_eucalyptus_property_dict(show_all=show_all)
-        for key in self._get_keys():
-            attr = self.__getattribute__(key)
-            if isinstance(attr, ConfigProperty) and \
-                    isinstance(attr.value, BaseConfig):
-                property_dict.update(attr.value._aggregate_eucalyptus_properties(show_all=show_all))
-        return property_dict
+        return dict(self._eucalyptus_property_values[bool(show_all)])
+
+
+def _render_json_value(value, level, show_all, kwargs):
+    """
+    Renders value like json.dumps(value, sort_keys=True, indent=4) would at
+    nesting depth level, using the cached fragments of config objects.
+    """
+    if isinstance(value, BaseConfig):
+        return value._render_json(level, show_all, kwargs)
+    indent = '\n' + ' ' * 4 * (level + 1)
+    if isinstance(value, dict):
+        if not value:
+            return '{}'
+        items = [json.dumps(key if isinstance(key, basestring) else str(key)) + ': ' +
+                 _render_json_value(item, level + 1, show_all, kwargs)
+                 for key, item in sorted(value.items())]
+        return '{' + indent + (', ' + indent).join(items) + '\n' + ' ' * 4 * level + '}'
+    if isinstance(value, (list, tuple, NamedConfigList)):
+        items = [_render_json_value(item, level + 1, show_all, kwargs) for item in value]
+        if not items:
+            return '[]'
+        return '[' + indent + (', ' + indent).join(items) + '\n' + ' ' * 4 * level + ']'
+    return json.dumps(value)
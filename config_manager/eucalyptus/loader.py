@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+# Copyright 2009-2014 Eucalyptus Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Rebuilds a complete Eucalyptus config object graph from its json, ie:
+
+    eucalyptus = load_file('eucalyptus.json')
+    eucalyptus.topology.value.get_cluster('one').get_node('10.0.0.1')
+
+The document is decoded once. json's object_hook hands every object to
+the loader innermost first, so each object is built from its
+'property_type' as soon as it is decoded and is already complete when its
+parent is built.
+"""
+import json
+from config_manager.eucalyptus import Eucalyptus
+from config_manager.eucalyptus.enterprise import Enterprise
+from config_manager.eucalyptus.topology import Topology
+from config_manager.eucalyptus.topology.cluster import Cluster, _BLOCKSTORAGE_TYPES, _HYPERVISORS
+from config_manager.eucalyptus.topology.cluster.blockstorage.storage_controller import \
+    Storage_Controller
+from config_manager.eucalyptus.topology.cluster.clustercontroller import ClusterController
+from config_manager.eucalyptus.topology.network import Network
+
+
+def _build_eucalyptus(values):
+    eucalyptus = Eucalyptus(description=values.pop('description', None))
+    eucalyptus.update_from_dict(values)
+    return eucalyptus
+
+
+def _build_topology(values):
+    topology = Topology(name=values.pop('name', None),
+                        description=values.pop('description', None))
+    clusters = values.pop('clusters', None)
+    if clusters:
+        topology.add_clusters(clusters.values())
+    topology.update_from_dict(values)
+    return topology
+
+
+def _build_cluster(values):
+    cluster = Cluster(name=values.pop('name'),
+                      hypervisor=values.pop('hypervisor_type', None),
+                      blockstorage_type=values.pop('blockstorage_type', None),
+                      description=values.pop('description', None))
+    nodes = values.pop('nodes', None)
+    if nodes:
+        cluster.add_nodes(nodes)
+    cluster_controllers = values.pop('cluster_controllers', None)
+    if cluster_controllers:
+        cluster.add_cluster_controllers(cluster_controllers)
+    block_storage = values.pop('block_storage', None)
+    if block_storage:
+        # Block storage properties are named after the cluster, so it is
+        # left as a dict by the hook and created here
+        storage_controllers = block_storage.pop('storage_controllers', None)
+        created = cluster.create_block_storage(name=block_storage.pop('name', None))
+        if storage_controllers:
+            created.add_storage_controllers(storage_controllers)
+        created.update_from_dict(block_storage)
+    cluster.update_from_dict(values)
+    return cluster
+
+
+def _build_node(values):
+    node = _HYPERVISORS[values.pop('hypervisor').lower()](name=values.pop('name'),
+                                                          description=values.pop('description', None))
+    node.update_from_dict(values)
+    return node
+
+
+def _build_storage_controller(values):
+    storage_controller = Storage_Controller(name=values.pop('name', None),
+                                            hostname=values.pop('hostname'),
+                                            description=values.pop('description', None))
+    storage_controller.update_from_dict(values)
+    return storage_controller
+
+
+def _build_cluster_controller(values):
+    cluster_controller = ClusterController(hostname=values.pop('hostname'),
+                                           name=values.pop('name', None))
+    cluster_controller.update_from_dict(values)
+    return cluster_controller
+
+
+def _build_network(values):
+    network = Network(public_ips=values.pop('public_ips', None),
+                      private_ips=values.pop('private_ips', None),
+                      name=values.pop('name', None))
+    network.update_from_dict(values)
+    return network
+
+
+def _build_enterprise(values):
+    enterprise = Enterprise(name=values.pop('name', None))
+    enterprise.update_from_dict(values)
+    return enterprise
+
+
+# property_type -> callable building the config object from its decoded json
+BUILDERS = {Eucalyptus.__name__: _build_eucalyptus,
+            Topology.__name__: _build_topology,
+            Cluster.__name__: _build_cluster,
+            Storage_Controller.__name__: _build_storage_controller,
+            ClusterController.__name__: _build_cluster_controller,
+            Network.__name__: _build_network,
+            Enterprise.__name__: _build_enterprise}
+for _hypervisor in _HYPERVISORS.values():
+    BUILDERS[_hypervisor.__name__] = _build_node
+
+
+# Block storage is built by its cluster, see _build_cluster()
+_DEFERRED = set(blockstorage.__name__ for blockstorage in _BLOCKSTORAGE_TYPES.values())
+
+
+def _object_hook(values):
+    property_type = values.get('property_type')
+    builder = BUILDERS.get(property_type)
+    if builder is None:
+        if property_type is not None and property_type not in _DEFERRED:
+            print 'warning unknown property_type "{0}", left as a dict'.format(property_type)
+        return values
+    return builder(values)
+
+
+def loads(text):
+    """
+    :param text: json of a config object as written by to_json()
+    :returns the rebuilt config object
+    """
+    return json.loads(text, object_hook=_object_hook)
+
+
+def load(fp):
+    return json.load(fp, object_hook=_object_hook)
+
+
+def load_file(file_path):
+    with open(file_path, 'rb') as config_file:
+        return load(config_file)
@@ -53,6 +53,8 @@ class Topology(BaseConfig):
                 raise ValueError('Cluster with name:"{0}" already exists'
                                  .format(cluster.name.value))
             self.clusters_property.value[cluster.name.value] = cluster
+            cluster._add_config_parent(self)
+        self.mark_dirty()
 
     def create_cluster(self, name, hypervisor, read_file_path=None, write_file_path=None):
         cluster = Cluster(name=name, hypervisor=hypervisor, read_file_path=read_file_path,
@@ -67,7 +69,9 @@ class Topology(BaseConfig):
 
     def delete_cluster(self, clustername):
         if clustername in self.clusters_property.value:
-            self.clusters_property.value.pop(clustername)
+            cluster = self.clusters_property.value.pop(clustername)
+            cluster._remove_config_parent(self)
+            self.mark_dirty()
         else:
             print 'clustername:"{0}" not in cluster list'.format(clustername)
 
@@ -87,12 +91,3 @@ class Topology(BaseConfig):
 
     def add_user_facing_services(self, user_facing_services):
         self.user_facing_services = user_facing_services
-
-    def _aggregate_eucalyptus_properties(self, show_all=False):
-        eucaproperties = {}
-        for key in self.clusters_property.value:
-            cluster = self.clusters_property.value[key]
-            eucaproperties.update(cluster._aggregate_eucalyptus_properties(show_all=show_all))
-        agg_dict = super(Topology, self)._aggregate_eucalyptus_properties(show_all=show_all)
-        eucaproperties.update(agg_dict)
-        return eucaproperties
@@ -13,10 +13,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from config_manager.baseconfig import BaseConfig
+from config_manager.baseconfig import BaseConfig, NamedConfigList
 from config_manager.eucalyptus_properties import EucalyptusProperty
 from config_manager.eucalyptus.topology.cluster.blockstorage import BlockStorage
 import config_manager.eucalyptus.topology.cluster.blockstorage
+from config_manager.eucalyptus.topology.cluster.clustercontroller import ClusterController
 
 from config_manager.eucalyptus.topology.cluster.nodecontroller import NodeController
 from config_manager.eucalyptus.topology.cluster.nodecontroller.hyperv import Hyperv
@@ -121,12 +122,14 @@ class Cluster(BaseConfig):
         self.network = self.create_property('network', value=None)
 
         # Store the cluster controller host objects...
-        self.cluster_controllers = self.create_property('cluster_controllers', value=[])
+        self.cluster_controllers = self.create_property('cluster_controllers', value=None,
+                                                        validate_callback=NamedConfigList.coerce)
 
-        # Store the cluster wide hypervisor type and list of node objects...
+        # Store the list of node objects and the cluster wide hypervisor type. Nodes are created
+        # first as the hypervisor type validation checks them...
+        self.nodes = self.create_property('nodes', value=None, validate_callback=NamedConfigList.coerce)
         self.hypervisor_type = self.create_property(
             'hypervisor_type', value=hypervisor, validate_callback=self.validate_hypervisor_type)
-        self.nodes = self.create_property('nodes', value=[])
 
         # todo decide if this is needed, or if esx node types are enough/better...
         self.vmware_brokers = self.create_property('vmware_brokers', value=None)
@@ -151,7 +154,9 @@ class Cluster(BaseConfig):
                              .format(blockstorage_type, hlist.rstrip(', ')))
         if not hasattr(self, 'blockstorage_type') or not self.blockstorage_type.value:
             return blockstorage_type
-        if (blockstorage_type != self.blockstorage_type.value) and self.storage_controllers.value:
+        block_storage = self.block_storage.value
+        if (blockstorage_type != self.blockstorage_type.value) and block_storage and \
+                block_storage.storage_controllers.value:
             raise ValueError('Must remove storage controllers to change type')
         return blockstorage_type
 
@@ -196,7 +201,7 @@ class Cluster(BaseConfig):
         if hypervisor == self.hypervisor_type.value:
             return hypervisor
         for node in self.nodes.value:
-            if node.hypervisor != hypervisor:
+            if node.hypervisor.value != hypervisor:
                 raise ValueError('Must delete all nodes if changing hypervisor type')
         return hypervisor
 
@@ -210,15 +215,15 @@ class Cluster(BaseConfig):
             if node.hypervisor.value != self.hypervisor_type.value:
                 raise ValueError('Node hypervisor type:"{0}" does not match clusters:"{1}"'
                                  .format(node.hypervisor.value, self.hypervisor_type))
-            if self.get_node(node.name):
-                raise ValueError('Node with name:"{0}" already exists in cluster'.format(node.name))
-            self.nodes.value.append(node)
+            if node.name.value in self.nodes.value:
+                raise ValueError('Node with name:"{0}" already exists in cluster'.format(node.name.value))
+        self.nodes.value.extend(nodes)
 
     def get_node(self, name):
-        for node in self.nodes.value:
-            if node.name.value == name:
-                return node
-        return None
+        return self.nodes.value.get(name)
+
+    def delete_node(self, name):
+        return self.nodes.value.remove(name)
 
     def create_node(self, ip, read_file_path=None, write_file_path=None,
                     description=None, version=None):
@@ -232,3 +237,28 @@ class Cluster(BaseConfig):
                               version=version)
         self.add_nodes(new_node)
         return new_node
+
+    def add_cluster_controllers(self, cluster_controllers):
+        if not cluster_controllers:
+            raise ValueError('add_cluster_controllers provided empty value: "{0}"'
+                             .format(cluster_controllers))
+        if not isinstance(cluster_controllers, list):
+            cluster_controllers = [cluster_controllers]
+        for cc in cluster_controllers:
+            assert isinstance(cc, ClusterController), \
+                'add cluster_controllers passed non ClusterController type, cc:"{0}"'.format(cc)
+            if cc.name.value in self.cluster_controllers.value:
+                raise ValueError('Cluster Controller with name:"{0}" already exists'
+                                 .format(cc.name.value))
+        self.cluster_controllers.value.extend(cluster_controllers)
+
+    def get_cluster_controller(self, name):
+        return self.cluster_controllers.value.get(name)
+
+    def delete_cluster_controller(self, name):
+        return self.cluster_controllers.value.remove(name)
+
+    def create_cluster_controller(self, hostname, name=None):
+        new_cc = ClusterController(hostname=hostname, name=name)
+        self.add_cluster_controllers(new_cc)
+        return new_cc
@@ -13,7 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from config_manager.baseconfig import BaseConfig, EucalyptusProperty
+from config_manager.baseconfig import BaseConfig, EucalyptusProperty, NamedConfigList
 from config_manager.eucalyptus.topology.cluster.blockstorage.storage_controller import \
     Storage_Controller
 
@@ -148,7 +148,8 @@ class BlockStorage(BaseConfig):
 
         # Create json configuration (blocks) properties
         self.storage_controllers = self.create_property(json_name='storage_controllers',
-                                                        value=[])
+                                                        value=storage_controllers,
+                                                        validate_callback=NamedConfigList.coerce)
 
         # Baseconfig init() will read in default values from read_file_path if it is populated.
         super(BlockStorage, self).__init__(name=name,
@@ -169,20 +170,16 @@ class BlockStorage(BaseConfig):
             assert isinstance(sc, Storage_Controller), \
                 'add storage_controller passed non BlockStorageController type, ' \
                 'sc:"{0}"'.format(sc)
-            if self.get_storage_controller(sc.name.value):
+            if sc.name.value in self.storage_controllers.value:
                 raise ValueError('Storage Controller with name:"{0}" already exists'
                                  .format(sc.name.value))
-            self.storage_controllers.value.append(sc)
+        self.storage_controllers.value.extend(storage_controllers)
 
     def get_storage_controller(self, name):
-        for sc in self.storage_controllers.value:
-            if sc.name == name:
-                return sc
+        return self.storage_controllers.value.get(name)
 
     def delete_storage_controller(self, name):
-        sc = self.get_storage_controller(name)
-        if sc:
-            self.storage_controllers.value.pop(sc)
+        return self.storage_controllers.value.remove(name)
 
     def create_storage_controller(self, hostname, name=None):
         new_sc = Storage_Controller(name=name, hostname=hostname)
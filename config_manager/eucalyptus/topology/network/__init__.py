@@ -14,8 +14,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from config_manager.baseconfig import BaseConfig
+from config_manager.eucalyptus.topology.network.ip_ranges import IPRangeSet, ip_to_int, split_entries
 import socket
-import copy
 
 
 class Network(BaseConfig):
@@ -44,11 +44,46 @@ class Network(BaseConfig):
                                       property_type=property_type,
                                       version=None)
 
+    @property
+    def ip_ranges(self):
+        """
+        Parsed ip entries per json property name, rebuilt whenever
+        public_ips or private_ips is set
+        """
+        if not hasattr(self, '_ip_ranges'):
+            self._ip_ranges = {}
+        return self._ip_ranges
+
+    @property
+    def public_ip_ranges(self):
+        """
+        IPRangeSet of the public ip entries. Use it to count the addresses
+        (size()), look them up ("ip" in ranges) or find free gaps (gaps())
+        """
+        return self.ip_ranges.setdefault('public_ips', IPRangeSet())
+
+    @property
+    def private_ip_ranges(self):
+        """
+        IPRangeSet of the private ip entries
+        """
+        return self.ip_ranges.setdefault('private_ips', IPRangeSet())
+
     def validate_privateips(self, privateips):
-        return self.validate_ip_strings(privateips)
+        return self._validate_ip_entries('private_ips', privateips)
 
     def validate_publicips(self, publicips):
-        return self.validate_ip_strings(publicips)
+        return self._validate_ip_entries('public_ips', publicips)
+
+    def _validate_ip_entries(self, json_name, iplist):
+        if iplist is None or iplist == []:
+            self.ip_ranges[json_name] = IPRangeSet()
+            return iplist
+        if not isinstance(iplist, list):
+            iplist = [iplist]
+        # Parsing validates the ips and checks the entries do not overlap
+        self.ip_ranges[json_name] = IPRangeSet(iplist)
+        return iplist
 
     def validate_ip_strings(self, iplist):
         if iplist is None or iplist == []:
@@ -68,64 +103,63 @@ class Network(BaseConfig):
         return iplist
 
     def add_public_ip_entry(self, public_ip_entry):
-        public_ip_list = copy.copy(self.public_ips.value)
         if not public_ip_entry:
             raise ValueError('Bad public ip:"{0}" pass to add_public_ip_entry'
                              .format(public_ip_entry))
-        for ip_entry in str(public_ip_entry).split(','):
-            newips = str(ip_entry).split('-')
-            self.validate_ip_strings(newips)
-            for entry in self.public_ips.value:
-                entry_ips = entry.split('-')
-                if len(entry_ips) == 1:
-                    if len(newips) == 1:
-                        newips.append(newips[0])
-                    if self.is_ip_in_range(entry_ips[0], newips[0], newips[1]):
-                        raise ValueError('New Public IP entry:"{0}" conflicts with existing '
-                                         'entry:"{1}"'
-                                         .format(ip_entry, entry))
-                else:
-                    for ip in newips:
-                        if self.is_ip_in_range(ip, entry_ips[0], entry_ips[1]):
-                            raise ValueError('New Public IP entry:"{0}" conflicts with existing '
-                                             'entry range:"{1}"'
-                                             .format(ip_entry, entry))
-            public_ip_list.append(ip_entry)
-        self.public_ips.value = public_ip_list
+        self.add_public_ip_entries(public_ip_entry)
 
     def add_private_ip_entry(self, private_ip_entry):
-        private_ip_list = copy.copy(self.private_ips.value)
         if not private_ip_entry:
             raise ValueError('Bad private ip:"{0}" pass to add_private_ip_entry'
                              .format(private_ip_entry))
-        for ip_entry in str(private_ip_entry).split(','):
-            newips = str(ip_entry).split('-')
-            self.validate_ip_strings(newips)
-            for entry in self.private_ips.value:
-                entry_ips = entry.split('-')
-                if len(entry_ips) == 1:
-                    entry_ips.append(entry_ips[0])
-                for ip in newips:
-                    if self.is_ip_in_range(ip, entry_ips[0], entry_ips[1]):
-                        raise ValueError('New Private IP entry:"{0}" conflicts with existing '
-                                         'entry:"{1}"'
-                                         .format(ip_entry, entry))
-            private_ip_list.append(ip_entry)
-        self.public_ips.value = private_ip_list
+        self.add_private_ip_entries(private_ip_entry)
+
+    def add_public_ip_entries(self, entries):
+        """
+        Adds many public ip entries at once. Nothing is added if any entry
+        conflicts with an existing one or another new one.
+        :param entries: list of entries and/or comma separated entries,
+                        ie: ['10.1.1.1-10.1.1.100', '10.1.2.1']
+        """
+        self._add_ip_entries(self.public_ips, 'Public', entries)
+
+    def add_private_ip_entries(self, entries):
+        """
+        Adds many private ip entries at once, see add_public_ip_entries()
+        """
+        self._add_ip_entries(self.private_ips, 'Private', entries)
+
+    def remove_public_ip_entries(self, entries):
+        """
+        Removes addresses from the public ips, existing ranges only partly
+        covered by an entry are split.
+        :returns int, number of addresses removed
+        """
+        return self._remove_ip_entries(self.public_ips, entries)
+
+    def remove_private_ip_entries(self, entries):
+        """
+        Removes addresses from the private ips, see remove_public_ip_entries()
+        """
+        return self._remove_ip_entries(self.private_ips, entries)
+
+    def _add_ip_entries(self, ip_property, label, entries):
+        if not split_entries(entries):
+            raise ValueError('No {0} ip entries given'.format(label.lower()))
+        ranges = self.ip_ranges.setdefault(ip_property.name, IPRangeSet())
+        try:
+            added = ranges.add(entries)
+        except ValueError as ve:
+            raise ValueError('New {0} IP entries conflict: {1}'.format(label, ve))
+        # The entries were validated by the range set, skip re-parsing them all
+        self._set_json_property(ip_property.name, list(ip_property.value or []) + added)
+
+    def _remove_ip_entries(self, ip_property, entries):
+        ranges = self.ip_ranges.setdefault(ip_property.name, IPRangeSet())
+        removed = ranges.remove(entries)
+        if removed:
+            self._set_json_property(ip_property.name, ranges.entries())
+        return removed
 
     def is_ip_in_range(self, ip, range_start, range_end):
-        self.validate_ip_strings([ip, range_start, range_end])
-        if ip == range_start or ip == range_end:
-            return True
-        ip_octs = ip.split('.')
-        rangestart_octs = range_start.split('.')
-        rangeend_octs = range_end.split('.')
-        for x in xrange(0, len(rangestart_octs)):
-            if rangestart_octs[x] > ip_octs[x]:
-                return False
-            elif rangestart_octs[x] < ip_octs[x]:
-                for y in xrange(0, len(rangeend_octs)):
-                    if rangeend_octs[y] < ip_octs[y]:
-                        return False
-                return True
-        return False
+        return ip_to_int(range_start) <= ip_to_int(ip) <= ip_to_int(range_end)
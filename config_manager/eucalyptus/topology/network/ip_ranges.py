@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# Copyright 2009-2014 Eucalyptus Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from bisect import bisect_left, bisect_right
+from heapq import merge
+import socket
+import struct
+
+
+def ip_to_int(ip):
+    try:
+        return struct.unpack('!I', socket.inet_aton(ip))[0]
+    except socket.error as se:
+        se.args = ('{0}: "{1}"'.format(se.args[0], ip),) + se.args[1:]
+        raise se
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def parse_entry(entry):
+    """
+    Parses a single ip entry as used in the network config, ie: "10.1.1.1" or
+    "10.1.1.1-10.1.1.100"
+    :returns tuple (first, last) of the entry's addresses as ints
+    """
+    ips = str(entry).strip().split('-')
+    if len(ips) > 2:
+        raise ValueError('Bad ip entry:"{0}"'.format(entry))
+    first = ip_to_int(ips[0].strip())
+    last = ip_to_int(ips[-1].strip())
+    if last < first:
+        raise ValueError('Bad ip entry:"{0}", range ends before it starts'
+                         .format(entry))
+    return first, last
+
+
+def format_entry(first, last):
+    if first == last:
+        return int_to_ip(first)
+    return '{0}-{1}'.format(int_to_ip(first), int_to_ip(last))
+
+
+def split_entries(entries):
+    """
+    Accepts a list of entries and/or comma separated strings of entries
+    :returns list of the single entries
+    """
+    if entries is None:
+        return []
+    if not isinstance(entries, (list, tuple)):
+        entries = [entries]
+    result = []
+    for item in entries:
+        result.extend(entry for entry in str(item).split(',') if entry.strip())
+    return result
+
+
+class IPRangeSet(object):
+    """
+    Set of non-overlapping ip ranges kept as two sorted lists of ints (range
+    starts and range ends). Entries are parsed once, overlap checks and
+    lookups are a bisect instead of a scan over every existing entry.
+    Ranges are kept as given, adjacent entries are not merged so the set can
+    be written back as the same entries.
+    """
+
+    def __init__(self, entries=None):
+        self._starts = []
+        self._ends = []
+        self._size = 0
+        if entries:
+            self.add(entries)
+
+    def add(self, entries):
+        """
+        Adds entries, nothing is added if any of them conflicts with an
+        existing entry or with another new one.
+        :param entries: list of entries and/or comma separated entries
+        :returns list of the added entries as strings
+        """
+        new = sorted(parse_entry(entry) for entry in split_entries(entries))
+        for index, (first, last) in enumerate(new):
+            if index and new[index - 1][1] >= first:
+                raise ValueError('Entry:"{0}" conflicts with entry:"{1}"'
+                                 .format(format_entry(first, last),
+                                         format_entry(*new[index - 1])))
+            conflict = self.find_overlap(first, last)
+            if conflict:
+                raise ValueError('Entry:"{0}" conflicts with existing entry:"{1}"'
+                                 .format(format_entry(first, last),
+                                         format_entry(*conflict)))
+        if len(new) == 1:
+            first, last = new[0]
+            index = bisect_left(self._starts, first)
+            self._starts.insert(index, first)
+            self._ends.insert(index, last)
+        elif new:
+            ranges = list(merge(zip(self._starts, self._ends), new))
+            self._starts = [first for first, _ in ranges]
+            self._ends = [last for _, last in ranges]
+        self._size += sum(last - first + 1 for first, last in new)
+        return [format_entry(first, last) for first, last in new]
+
+    def remove(self, entries):
+        """
+        Removes the addresses of entries from the set, ranges only partly
+        covered by an entry are split. Every entry is parsed before the set
+        is changed, nothing is removed if any of them is invalid.
+        :param entries: list of entries and/or comma separated entries
+        :returns int, number of addresses removed
+        """
+        removed = 0
+        for first, last in [parse_entry(entry) for entry in split_entries(entries)]:
+            start = bisect_left(self._ends, first)
+            stop = bisect_right(self._starts, last)
+            if start >= stop:
+                continue
+            starts = []
+            ends = []
+            if self._starts[start] < first:
+                starts.append(self._starts[start])
+                ends.append(first - 1)
+            if self._ends[stop - 1] > last:
+                starts.append(last + 1)
+                ends.append(self._ends[stop - 1])
+            covered = sum(self._ends[index] - self._starts[index] + 1
+                          for index in xrange(start, stop))
+            covered -= sum(end - begin + 1 for begin, end in zip(starts, ends))
+            self._starts[start:stop] = starts
+            self._ends[start:stop] = ends
+            self._size -= covered
+            removed += covered
+        return removed
+
+    def find_overlap(self, first, last):
+        """
+        :returns tuple (first, last) of an existing range overlapping
+                 first-last, or None
+        """
+        index = bisect_right(self._starts, last)
+        if index and self._ends[index - 1] >= first:
+            return self._starts[index - 1], self._ends[index - 1]
+        return None
+
+    def __contains__(self, ip):
+        if not isinstance(ip, (int, long)):
+            ip = ip_to_int(ip)
+        return self.find_overlap(ip, ip) is not None
+
+    def __len__(self):
+        return len(self._starts)
+
+    def size(self):
+        """
+        :returns int, total number of addresses in the set
+        """
+        return self._size
+
+    def ranges(self):
+        return zip(self._starts, self._ends)
+
+    def entries(self):
+        return [format_entry(first, last) for first, last in self.ranges()]
+
+    def gaps(self, first=None, last=None):
+        """
+        Finds the addresses between first and last which are not in the set.
+        :param first: first address to consider, defaults to the start of the
+                      lowest range
+        :param last: last address to consider, defaults to the end of the
+                     highest range
+        :returns list of the free ranges as entry strings
+        """
+        if not self._starts and (first is None or last is None):
+            return []
+        first = self._starts[0] if first is None else ip_to_int(first)
+        last = self._ends[-1] if last is None else ip_to_int(last)
+        gaps = []
+        current = first
+        index = bisect_left(self._ends, first)
+        while current <= last and index < len(self._starts):
+            if self._starts[index] > last:
+                break
+            if self._starts[index] > current:
+                gaps.append(format_entry(current, self._starts[index] - 1))
+            current = max(current, self._ends[index] + 1)
+            index += 1
+        if current <= last:
+            gaps.append(format_entry(current, last))
+        return gaps
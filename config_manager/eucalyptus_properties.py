@@ -52,9 +52,10 @@ class EucalyptusProperty(object):
     def value(self, newvalue):
         newvalue = self.validate(newvalue)
         self._value = newvalue
+        self.properties_manager.changed(self)
 
     def delete(self):
-        self.configmanager.delete_eucalyptus_property(self)
+        self.properties_manager.delete_property(property_string=self.name)
 
     def validate(self, value):
         return value
@@ -76,17 +77,49 @@ class EucalyptusProperty(object):
 
 
 class EucalyptusProperties(Namespace):
+    # The config object these properties belong to, told about new properties and value changes
+    # so it can keep its property index and cached json current
+    _owner = None
+
+    def changed(self, prop):
+        if self._owner is not None:
+            self._owner._eucalyptus_property_changed(prop)
+            self._owner.mark_dirty()
+
+    @property
+    def properties_by_name(self):
+        """
+        Index of attribute name -> EucalyptusProperty
+        """
+        if '_properties_by_name' not in self.__dict__:
+            self.__dict__['_properties_by_name'] = {}
+        return self.__dict__['_properties_by_name']
+
+    @property
+    def names_by_property_string(self):
+        """
+        Index of property string -> attribute name
+        """
+        if '_names_by_property_string' not in self.__dict__:
+            self.__dict__['_names_by_property_string'] = {}
+        return self.__dict__['_names_by_property_string']
 
     def __setattr__(self, key, value):
         # Set some constraints/checks for handling EucalyptusProperty attributes
         if isinstance(value, EucalyptusProperty):
             propertyobj = value
-            if self.get_property_by_property_string(propertyobj.name):
+            if propertyobj.name in self.names_by_property_string:
                 raise ValueError("Property already exists with name:'{0}'".format(propertyobj.name))
-        if self.get_property_by_name(key):
+        if key in self.properties_by_name:
             raise ValueError('EucalyptusProperty obj is ready only, did you mean: '
                              '"{0}.value = {1}" ?'.format(key, value))
         self.__dict__[key] = value
+        if isinstance(value, EucalyptusProperty):
+            self.properties_by_name[key] = value
+            self.names_by_property_string[value.name] = key
+            if self._owner is not None:
+                self._owner._index_eucalyptus_properties({value.name: value})
+                self._owner.mark_dirty()
 
     def create_property(self,
                         name,
@@ -106,35 +139,42 @@ class EucalyptusProperties(Namespace):
                                                   default_value=default_value))
 
     def get_property_by_name(self, name):
-        props = self.get_all_properties(name)
-        if props:
-            return props[0]
-        return None
+        return self.properties_by_name.get(name)
 
     def get_property_by_property_string(self, property_string):
-        props = self.get_all_properties(property_string=property_string)
-        if props:
-            return props[0]
-        return None
+        name = self.names_by_property_string.get(property_string)
+        if name is None:
+            return None
+        return self.properties_by_name[name]
 
     def get_all_properties(self, name=None, property_string=None):
-        props = []
-        for key in self._get_keys():
-            # First sort out by the attribute's name if name was provided as a filter
-            if name is not None and key != name:
-                continue
-            attr = self.__getattribute__(key)
-            if isinstance(attr, EucalyptusProperty):
-                # Filter out matching property_strings if property_string was provided as a filter
-                if property_string is not None and attr.name != property_string:
-                    continue
-                props.append(attr)
-        return props
+        if name is not None:
+            props = [self.get_property_by_name(name)]
+        elif property_string is not None:
+            props = [self.get_property_by_property_string(property_string)]
+        else:
+            return self.properties_by_name.values()
+        return [prop for prop in props
+                if prop is not None and (property_string is None or prop.name == property_string)]
 
     def delete_property(self, name=None, property_string=None):
-        prop = self.get_property(name)
-        if prop:
-            self.__delattr__(name)
+        """
+        Removes a property by attribute name or by property string
+        :returns the removed EucalyptusProperty or None
+        """
+        if name is None:
+            name = self.names_by_property_string.get(property_string)
+        prop = self.get_all_properties(name=name, property_string=property_string) if name else None
+        if not prop:
+            return None
+        prop = prop[0]
+        del self.__dict__[name]
+        del self.properties_by_name[name]
+        del self.names_by_property_string[prop.name]
+        if self._owner is not None:
+            self._owner._unindex_eucalyptus_properties({prop.name: prop})
+            self._owner.mark_dirty()
+        return prop
 
     def get_eucalyptus_property_dict(self, show_all=True):
         prop_dict = {}
@@ -0,0 +1,83 @@
+from config_manager.eucalyptus import Eucalyptus
+import json
+
+
+def _build():
+    eucalyptus = Eucalyptus()
+    topology = eucalyptus.create_topology()
+    cluster = topology.create_cluster('one', hypervisor='kvm')
+    for host in range(1, 20):
+        cluster.create_node('10.0.0.{0}'.format(host))
+    return eucalyptus, cluster
+
+
+def test_to_json_matches_json_dumps():
+    eucalyptus, cluster = _build()
+    for show_all in (False, True):
+        output = eucalyptus.to_json(show_all=show_all)
+        assert output == json.dumps(json.loads(output), sort_keys=True, indent=4)
+
+
+def test_to_json_is_cached_until_a_change():
+    eucalyptus, cluster = _build()
+    first = eucalyptus.to_json()
+    assert eucalyptus.to_json() is first
+    node = cluster.get_node('10.0.0.7')
+    node.max_cores.value = 32
+    # Only the changed path is dropped
+    assert not node.json_cache and not cluster.json_cache and not eucalyptus.json_cache
+    assert cluster.get_node('10.0.0.8').json_cache
+    assert '"max-cores": 32' in eucalyptus.to_json()
+
+
+def test_eucalyptus_property_change_reaches_root():
+    eucalyptus, cluster = _build()
+    eucalyptus.to_json()
+    cluster.eucalyptus_properties.vnetsubnet.value = '10.9.0.0'
+    assert json.loads(eucalyptus.to_json())['eucalyptus_properties']['one.cluster.vnetsubnet'] == '10.9.0.0'
+
+
+def test_node_changes_reach_root():
+    eucalyptus, cluster = _build()
+    eucalyptus.to_json()
+    cluster.delete_node('10.0.0.1')
+    cluster.create_node('10.0.0.100')
+    nodes = json.loads(eucalyptus.to_json())['topology']['clusters']['one']['nodes']
+    assert [node['name'] for node in nodes][-2:] == ['10.0.0.19', '10.0.0.100']
+    assert len(nodes) == 19
+
+
+def test_property_index_follows_attach_and_detach():
+    eucalyptus, cluster = _build()
+    cluster.blockstorage_type.value = 'overlay'
+    cluster.create_block_storage()
+    index = eucalyptus.eucalyptus_property_index
+    assert index['one.cluster.vnetsubnet'] is cluster.eucalyptus_properties.vnetsubnet
+    assert 'one.storage.blockstoragemanager' in index
+    assert eucalyptus._aggregate_eucalyptus_properties()['one.storage.blockstoragemanager'] == 'overlay'
+    assert 'one.cluster.vnetsubnet' not in eucalyptus._aggregate_eucalyptus_properties()
+    cluster.eucalyptus_properties.vnetsubnet.value = '10.9.0.0'
+    assert eucalyptus._aggregate_eucalyptus_properties()['one.cluster.vnetsubnet'] == '10.9.0.0'
+    cluster.delete_block_storage()
+    assert 'one.storage.blockstoragemanager' not in index
+    eucalyptus.topology.value.delete_cluster('one')
+    assert sorted(index) == ['bootstrap.webservices.use_dns_delegation']
+
+
+def test_update_from_dict_dispatches_to_children():
+    source, cluster = _build()
+    source.set_log_level('DEBUG')
+    cluster.get_node('10.0.0.3').max_cores.value = 16
+    cluster.eucalyptus_properties.vnetsubnet.value = '10.9.0.0'
+    target, target_cluster = _build()
+    target.update_from_dict(json.loads(source.to_json()))
+    assert target.log_level.value == 'DEBUG'
+    assert target_cluster.get_node('10.0.0.3').max_cores.value == 16
+    assert target_cluster.eucalyptus_properties.vnetsubnet.value == '10.9.0.0'
+    assert target.to_json() == source.to_json()
+
+
+def test_get_attr_by_json_name():
+    eucalyptus = Eucalyptus()
+    assert eucalyptus.get_attr_by_json_name('log-level') is eucalyptus.log_level
+    assert eucalyptus.get_attr_by_json_name('nope') is None
@@ -0,0 +1,54 @@
+from config_manager.baseconfig import NamedConfigList
+from config_manager.eucalyptus.topology.cluster import Cluster
+from config_manager.eucalyptus.topology.cluster.blockstorage.storage_controller import Storage_Controller
+from config_manager.eucalyptus.topology.cluster.nodecontroller.kvm import Kvm
+from nose.tools import assert_raises
+import json
+
+
+def test_create_cluster_with_hypervisor():
+    cluster = Cluster('one', hypervisor='kvm')
+    assert cluster.hypervisor_type.value == 'kvm'
+
+
+def test_node_lookup_and_delete():
+    cluster = Cluster('one', hypervisor='kvm')
+    cluster.add_nodes([Kvm(name='10.0.0.{0}'.format(host)) for host in range(1, 200)])
+    assert cluster.get_node('10.0.0.50').name.value == '10.0.0.50'
+    assert cluster.get_node('10.0.1.1') is None
+    assert_raises(ValueError, cluster.add_nodes, Kvm(name='10.0.0.50'))
+    assert cluster.delete_node('10.0.0.50').name.value == '10.0.0.50'
+    assert cluster.get_node('10.0.0.50') is None
+    assert len(cluster.nodes.value) == 198
+    cluster.create_node('10.0.0.50')
+    names = [node['name'] for node in json.loads(cluster.to_json())['nodes']]
+    assert names[0] == '10.0.0.1' and names[-1] == '10.0.0.50'
+    assert len(names) == 199
+
+
+def test_storage_controllers():
+    cluster = Cluster('one', hypervisor='kvm', blockstorage_type='overlay')
+    block_storage = cluster.create_block_storage()
+    block_storage.create_storage_controller('sc-host')
+    assert block_storage.get_storage_controller('sc-host').hostname.value == 'sc-host'
+    assert_raises(ValueError, block_storage.add_storage_controllers, Storage_Controller(None, 'sc-host'))
+    assert_raises(ValueError, cluster.blockstorage_type.__setattr__, 'value', 'das')
+    block_storage.delete_storage_controller('sc-host')
+    assert block_storage.get_storage_controller('sc-host') is None
+
+
+def test_cluster_controllers():
+    cluster = Cluster('one')
+    cluster.create_cluster_controller('cc-host')
+    assert cluster.get_cluster_controller('cc-host').hostname.value == 'cc-host'
+    cluster.delete_cluster_controller('cc-host')
+    assert not cluster.cluster_controllers.value
+
+
+def test_named_config_list_keeps_order_after_deletes():
+    items = NamedConfigList([Kvm(name=str(number)) for number in range(10)])
+    for number in range(0, 10, 3):
+        items.remove(str(number))
+    assert items.names() == ['1', '2', '4', '5', '7', '8']
+    assert items.get('7').name.value == '7'
+    assert '3' not in items
@@ -0,0 +1,36 @@
+from config_manager.eucalyptus.topology.cluster import Cluster
+from config_manager.eucalyptus_properties import EucalyptusProperties, EucalyptusProperty
+from nose.tools import assert_raises
+
+
+def test_lookups_and_duplicates():
+    properties = EucalyptusProperties()
+    properties.create_property('tasktimeout', 'one.storage.tasktimeout', value=5)
+    prop = properties.get_property_by_name('tasktimeout')
+    assert properties.get_property_by_property_string('one.storage.tasktimeout') is prop
+    assert properties.get_all_properties(property_string='one.storage.tasktimeout') == [prop]
+    assert properties.get_property_by_name('nope') is None
+    assert_raises(ValueError, properties.create_property, 'other', 'one.storage.tasktimeout')
+    assert_raises(ValueError, setattr, properties, 'tasktimeout', 6)
+    assert_raises(ValueError, setattr, properties, 'tasktimeout',
+                  EucalyptusProperty('one.storage.other', properties))
+
+
+def test_delete_property_keeps_indexes_consistent():
+    properties = EucalyptusProperties()
+    properties.create_property('tasktimeout', 'one.storage.tasktimeout')
+    properties.create_property('tid', 'one.storage.tid')
+    assert properties.delete_property(property_string='one.storage.tasktimeout').name == 'one.storage.tasktimeout'
+    assert properties.get_property_by_property_string('one.storage.tasktimeout') is None
+    assert not hasattr(properties, 'tasktimeout')
+    properties.create_property('tasktimeout', 'one.storage.tasktimeout')
+    properties.tid.delete()
+    assert [prop.name for prop in properties.get_all_properties()] == ['one.storage.tasktimeout']
+    assert properties.delete_property(name='tid') is None
+
+
+def test_delete_property_updates_owner_index():
+    cluster = Cluster('one')
+    assert 'one.cluster.vnettype' in cluster.eucalyptus_property_index
+    cluster.eucalyptus_properties.delete_property('vnettype')
+    assert 'one.cluster.vnettype' not in cluster.eucalyptus_property_index
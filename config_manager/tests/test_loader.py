@@ -0,0 +1,48 @@
+from config_manager.eucalyptus import Eucalyptus
+from config_manager.eucalyptus.loader import load_file, loads
+from config_manager.eucalyptus.topology.cluster.blockstorage.ceph import Ceph
+from config_manager.eucalyptus.topology.cluster.nodecontroller.xen import Xen
+import os
+import shutil
+import tempfile
+
+
+def _build():
+    eucalyptus = Eucalyptus()
+    eucalyptus.set_log_level('INFO')
+    topology = eucalyptus.create_topology()
+    cluster = topology.create_cluster('one', hypervisor='kvm')
+    cluster.blockstorage_type.value = 'ceph'
+    cluster.create_block_storage().create_storage_controller('sc-host')
+    cluster.create_cluster_controller('cc-host')
+    cluster.eucalyptus_properties.vnetsubnet.value = '10.9.0.0'
+    for host in range(1, 10):
+        cluster.create_node('10.0.0.{0}'.format(host)).max_cores.value = host
+    topology.create_cluster('two', hypervisor='xen').create_node('10.1.0.1')
+    return eucalyptus
+
+
+def test_loads_rebuilds_the_object_graph():
+    eucalyptus = _build()
+    loaded = loads(eucalyptus.to_json())
+    assert isinstance(loaded, Eucalyptus)
+    cluster = loaded.topology.value.get_cluster('one')
+    assert isinstance(cluster.block_storage.value, Ceph)
+    assert cluster.block_storage.value.get_storage_controller('sc-host').hostname.value == 'sc-host'
+    assert cluster.get_cluster_controller('cc-host') is not None
+    assert cluster.get_node('10.0.0.4').max_cores.value == 4
+    assert cluster.eucalyptus_properties.vnetsubnet.value == '10.9.0.0'
+    assert isinstance(loaded.topology.value.get_cluster('two').get_node('10.1.0.1'), Xen)
+    assert loaded.to_json() == eucalyptus.to_json()
+    assert loaded.to_json(show_all=True) == eucalyptus.to_json(show_all=True)
+
+
+def test_load_file():
+    eucalyptus = _build()
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'eucalyptus.json')
+        eucalyptus.save(path)
+        assert load_file(path).to_json() == eucalyptus.to_json()
+    finally:
+        shutil.rmtree(directory)
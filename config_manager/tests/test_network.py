@@ -0,0 +1,63 @@
+from config_manager.eucalyptus.topology.network import Network
+from config_manager.eucalyptus.topology.network.ip_ranges import IPRangeSet
+from nose.tools import assert_raises
+import socket
+
+
+def test_is_ip_in_range_compares_numerically():
+    network = Network([], [])
+    assert network.is_ip_in_range('10.1.1.10', '10.1.1.9', '10.1.1.100')
+    assert not network.is_ip_in_range('10.1.1.9', '10.1.1.10', '10.1.1.100')
+
+
+def test_add_entries_rejects_overlaps():
+    network = Network(['10.1.1.10-10.1.1.20'], [])
+    network.add_public_ip_entry('10.1.1.21,10.1.1.30-10.1.1.40')
+    assert network.public_ips.value == ['10.1.1.10-10.1.1.20', '10.1.1.21', '10.1.1.30-10.1.1.40']
+    assert_raises(ValueError, network.add_public_ip_entry, '10.1.1.9-10.1.1.10')
+    assert_raises(ValueError, network.add_public_ip_entries, ['10.1.1.50-10.1.1.60', '10.1.1.55'])
+    assert network.public_ip_ranges.size() == 23
+    assert '10.1.1.35' in network.public_ip_ranges
+    assert '10.1.1.25' not in network.public_ip_ranges
+
+
+def test_add_private_entry_updates_private_ips():
+    network = Network(['10.1.1.1'], [])
+    network.add_private_ip_entry('192.168.0.1-192.168.0.9')
+    assert network.public_ips.value == ['10.1.1.1']
+    assert network.private_ips.value == ['192.168.0.1-192.168.0.9']
+
+
+def test_overlapping_entries_fail_validation():
+    assert_raises(ValueError, Network, ['10.1.1.1-10.1.1.9', '10.1.1.5'], [])
+
+
+def test_remove_splits_ranges():
+    network = Network(['10.1.1.1-10.1.1.100'], [])
+    assert network.remove_public_ip_entries('10.1.1.10-10.1.1.19') == 10
+    assert network.public_ips.value == ['10.1.1.1-10.1.1.9', '10.1.1.20-10.1.1.100']
+    assert network.public_ip_ranges.size() == 90
+
+
+def test_remove_is_all_or_nothing():
+    network = Network(['10.1.1.1-10.1.1.100'], [])
+    assert_raises(socket.error, network.remove_public_ip_entries, ['10.1.1.10-10.1.1.19', 'bogus'])
+    assert network.public_ips.value == ['10.1.1.1-10.1.1.100']
+    assert network.public_ip_ranges.size() == 100
+
+
+def test_gaps():
+    ranges = IPRangeSet(['10.1.1.10-10.1.1.19', '10.1.1.30', '10.1.1.40-10.1.1.49'])
+    assert ranges.gaps() == ['10.1.1.20-10.1.1.29', '10.1.1.31-10.1.1.39']
+    expected = ['10.1.1.1-10.1.1.9', '10.1.1.20-10.1.1.29', '10.1.1.31-10.1.1.39', '10.1.1.50-10.1.1.255']
+    assert ranges.gaps('10.1.1.1', '10.1.1.255') == expected
+
+
+def test_bulk_add():
+    entries = ['10.{0}.{1}.0-10.{0}.{1}.127'.format(second, third) for second in range(40) for third in range(100)]
+    ranges = IPRangeSet()
+    ranges.add(entries[1::2])
+    ranges.add(entries[::2])
+    assert len(ranges) == 4000
+    assert ranges.size() == 4000 * 128
+    assert ranges.entries() == entries
@@ -0,0 +1,233 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009-2014, Eucalyptus Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use of this software in source and binary forms, with or
+# without modification, are permitted provided that the following conditions
+# are met:
+#
+# Redistributions of source code must retain the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import threading
+import time
+import xmlrpclib
+
+
+class CobblerClient(object):
+    def __init__(self, cobbler_url, cobbler_user, cobbler_password, inventory_ttl=60):
+        """
+        Thin adapter over the Cobbler XML-RPC API that batches per-system calls into system.multicall requests, so
+        the cost of acting on a whole reservation is a handful of round trips rather than a few per host. Servers
+        without multicall support are detected on first use and served one call at a time.
+
+        System records are served from a local inventory loaded in bulk with get_systems. Once it is older than
+        inventory_ttl, Cobbler's last_modified_time is checked and the inventory reloaded only if something changed.
+
+        :param cobbler_url: (string) URL of cobbler server
+        :param cobbler_user: (string) cobbler user
+        :param cobbler_password: (string) cobbler user's password
+        :param inventory_ttl: (int) seconds the system inventory is trusted without asking Cobbler for changes
+        """
+        self.cobbler_url = cobbler_url
+        self._local = threading.local()
+        self.multicall_supported = True
+        self.inventory_ttl = inventory_ttl
+        self._inventory = None
+        self._inventory_mtime = None
+        self._inventory_checked = 0
+        self._inventory_lock = threading.Lock()
+        self.token = self.server.login(cobbler_user, cobbler_password)
+
+    @property
+    def server(self):
+        """
+        xmlrpclib proxies keep a single HTTP connection open and are not safe to share between threads, so every
+        thread gets its own proxy. The login token is valid across all of them.
+        """
+        proxy = getattr(self._local, 'server', None)
+        if proxy is None:
+            proxy = xmlrpclib.Server(self.cobbler_url)
+            self._local.server = proxy
+        return proxy
+
+    def batch(self, calls):
+        """
+        Run several XML-RPC calls in one round trip. A call that fails has its xmlrpclib.Fault in its place in the
+        results rather than failing the calls batched with it.
+
+        :param calls: list of (method name, args tuple)
+        :return: list of results or Faults in the same order as calls
+        """
+        if not calls:
+            return []
+        results = []
+        if self.multicall_supported:
+            multicall = xmlrpclib.MultiCall(self.server)
+            for method, args in calls:
+                getattr(multicall, method)(*args)
+            try:
+                outcomes = multicall()
+            except xmlrpclib.Fault as fault:
+                if 'system.multicall' not in fault.faultString:
+                    raise
+                print "Cobbler server does not support system.multicall, falling back to single calls"
+                self.multicall_supported = False
+            else:
+                # The iterator raises the Fault of a failed entry when it is read
+                for index in range(len(calls)):
+                    try:
+                        results.append(outcomes[index])
+                    except xmlrpclib.Fault as fault:
+                        results.append(fault)
+                return results
+        for method, args in calls:
+            try:
+                results.append(getattr(self.server, method)(*args))
+            except xmlrpclib.Fault as fault:
+                results.append(fault)
+        return results
+
+    def inventory(self):
+        """
+        :return: (dict) system name -> system record for every system Cobbler knows about
+        """
+        with self._inventory_lock:
+            if self._inventory is None:
+                self._load_inventory()
+            elif time.time() - self._inventory_checked > self.inventory_ttl:
+                if self.server.last_modified_time() != self._inventory_mtime:
+                    self._load_inventory()
+                else:
+                    self._inventory_checked = time.time()
+            return self._inventory
+
+    def _load_inventory(self):
+        # Read the modification time first so that changes made during the load trigger another one
+        self._inventory_mtime = self.server.last_modified_time()
+        self._inventory = dict((system['name'], system) for system in self.server.get_systems())
+        self._inventory_checked = time.time()
+
+    def invalidate(self, system_names=None):
+        """
+        Drop systems from the inventory so they are fetched again on next use.
+
+        :param system_names: list of system names, or None to drop the whole inventory
+        """
+        with self._inventory_lock:
+            if system_names is None or self._inventory is None:
+                self._inventory = None
+                return
+            for name in system_names:
+                self._inventory.pop(name, None)
+
+    def get_system(self, system_name):
+        systems = self.get_systems([system_name])
+        if system_name not in systems:
+            raise KeyError('Cobbler system "{0}" could not be fetched'.format(system_name))
+        return systems[system_name]
+
+    def get_systems(self, system_names):
+        """
+        :param system_names: list of system names
+        :return: (dict) system name -> system record, systems Cobbler failed to return are left out
+        """
+        inventory = self.inventory()
+        systems = dict((name, inventory.get(name)) for name in system_names)
+        missing = [name for name, system in systems.items() if system is None]
+        if missing:
+            fetched = {}
+            for name, system in zip(missing, self.batch([('get_system', (name,)) for name in missing])):
+                if isinstance(system, xmlrpclib.Fault):
+                    print "Could not get system " + name + " from Cobbler: " + system.faultString
+                    del systems[name]
+                else:
+                    fetched[name] = system
+            with self._inventory_lock:
+                if self._inventory is not None:
+                    self._inventory.update(fetched)
+            systems.update(fetched)
+        return systems
+
+    def get_ip(self, system_name, interface='eth0'):
+        return self.get_system(system_name)['interfaces'][interface]['ip_address']
+
+    def get_ips(self, system_names, interface='eth0'):
+        """
+        :param system_names: list of system names
+        :param interface: interface whose address to return
+        :return: (dict) system name -> IP address, systems Cobbler failed to return are left out
+        """
+        systems = self.get_systems(system_names)
+        return dict((name, system['interfaces'][interface]['ip_address']) for name, system in systems.items())
+
+    def kickstart(self, system_names, profile):
+        """
+        Switch systems to a profile, enable netboot and reboot them. Costs four round trips however many systems
+        are given: one for the handles, one for all modifications, one for the saves and a single power request. A
+        system whose calls fail is not saved, so Cobbler keeps its old settings, and it is left out of the reboot.
+        The others go ahead.
+
+        :param system_names: list of system names
+        :param profile: cobbler profile to install
+        :return: list of the systems that were kickstarted
+        """
+        if not system_names:
+            return []
+        handles = self.batch([('get_system_handle', (name, self.token)) for name in system_names])
+        named = []
+        calls = []
+        for name, handle in zip(system_names, handles):
+            if isinstance(handle, xmlrpclib.Fault):
+                print "Could not kickstart " + name + ": " + handle.faultString
+                continue
+            named.append((name, handle))
+            calls.append(('modify_system', (handle, "profile", profile, self.token)))
+            calls.append(('modify_system', (handle, "netboot-enabled", 1, self.token)))
+        # A multicall carries on past a fault, so saves go in a batch of their own and only for systems whose
+        # modifications all went through. Otherwise a half changed system would be saved.
+        modified = self._succeeded(named, self.batch(calls), 2)
+        saved = self._succeeded(modified, self.batch([('save_system', (handle, self.token))
+                                                      for _, handle in modified]), 1)
+        self.invalidate(system_names)
+        kickstarted = [name for name, _ in saved]
+        if kickstarted:
+            reboot_args = {"power": "reboot", "systems": kickstarted}
+            self.server.background_power_system(reboot_args, self.token)
+        return kickstarted
+
+    @staticmethod
+    def _succeeded(systems, results, calls_per_system):
+        """
+        :param systems: list of (name, handle) in the order their calls were batched
+        :param results: results of the batch, calls_per_system consecutive entries for each system
+        :return: the systems none of whose calls failed
+        """
+        succeeded = []
+        for index, system in enumerate(systems):
+            faults = [result for result in results[index * calls_per_system:(index + 1) * calls_per_system]
+                      if isinstance(result, xmlrpclib.Fault)]
+            if faults:
+                print "Could not kickstart " + system[0] + ": " + faults[0].faultString
+            else:
+                succeeded.append(system)
+        return succeeded
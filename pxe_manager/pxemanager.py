@@ -31,34 +31,53 @@
 # Author: Tony Beckham tony@eucalyptus.com
 #
 import socket
-import xmlrpclib
-import json
+import threading
 
+from multiprocessing.pool import ThreadPool
 from time import sleep
-from paramiko import BadHostKeyException, AuthenticationException, SSHException, SSHClient, AutoAddPolicy
+from paramiko import BadHostKeyException, AuthenticationException, SSHException
+from pxe_manager.cobbler import CobblerClient
+from pxe_manager.readiness import ReadinessWatcher
+from pxe_manager.sshpool import SSHConnectionPool
+from resource_manager.client import IPPoolClient, RequestFailureException
+from resource_manager.query import Query
 
 
 class PxeManager(object):
     def __init__(self, cobbler_url, cobbler_user, cobbler_password, host_manager_client, public_ip_manager_client,
-                 private_ip_manager_client, ssh_user="root", ssh_password="foobar"):
+                 private_ip_manager_client, ssh_user="root", ssh_password="foobar", max_workers=10,
+                 ssh_max_connections=64, ssh_idle_timeout=300, ssh_connect_timeout=10, ssh_banner_timeout=30,
+                 ssh_auth_timeout=30, lease_seconds=7 * 24 * 3600):
         """
 
         :param cobbler_url: (string) URL of cobbler server
         :param cobbler_user: (string) cobbler user
         :param cobbler_password: (string) cobbler user's password
         :param host_manager_client: (object) ResourceManger object for machines
-        :param public_ip_manager_client: (object) ResourceManger object for public IPs
-        :param private_ip_manager_client: (object) ResourceManger object for private IPs
+        :param public_ip_manager_client: (object) ResourceManger object for public IPs, or an IPPoolClient
+        :param private_ip_manager_client: (object) ResourceManger object for private IPs, or an IPPoolClient
         :param ssh_user: (string) user to attempt ssh login to reserved host
         :param ssh_password: (string) password for user of reserved host
+        :param max_workers: (int) maximum number of hosts to reserve concurrently
+        :param ssh_max_connections: (int) maximum number of pooled ssh connections
+        :param ssh_idle_timeout: (int) seconds before an unused pooled ssh connection is closed
+        :param ssh_connect_timeout: (int) seconds an ssh connect may take
+        :param ssh_banner_timeout: (int) seconds to wait for a host's ssh banner
+        :param ssh_auth_timeout: (int) seconds to wait for an ssh login to be accepted or refused
+        :param lease_seconds: (int) seconds until the resource manager reclaims reserved machines and IPs that were
+                              never freed, 0 to keep them until freed. Reservations held for longer have to be
+                              renewed with renew_reservation.
         """
-        self.cobbler = xmlrpclib.Server(cobbler_url)
-        self.token = self.cobbler.login(cobbler_user, cobbler_password)
+        self.cobbler = CobblerClient(cobbler_url, cobbler_user, cobbler_password)
+        self.token = self.cobbler.token
         self.host_manager = host_manager_client
         self.public_ip_manager = public_ip_manager_client
         self.private_ip_manager = private_ip_manager_client
         self.ssh_user = ssh_user
         self.ssh_password = ssh_password
+        self.ssh_pool = SSHConnectionPool(max_connections=ssh_max_connections, idle_timeout=ssh_idle_timeout,
+                                          connect_timeout=ssh_connect_timeout, banner_timeout=ssh_banner_timeout,
+                                          auth_timeout=ssh_auth_timeout)
         self.distro = {'esxi51': 'qa-vmwareesxi51u0-x86_64',
                        'esxi50': 'qa-vmwareesxi50u1-x86_64',
                        'centos': 'qa-centos6-x86_64-striped-drives',
@@ -67,46 +86,168 @@ class PxeManager(object):
         self.file_name = 'kickstart.check'
         self.public_ip_reservation = []
         self.private_ip_reservation = []
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.reservation_lock = threading.Lock()
 
     def make_host_reservation(self, owner, count, job_id, distro):
         """
-        Get machines from machine pool
+        Get machines from machine pool. Hosts are claimed with a single request to the resource manager, seeded in
+        parallel (at most max_workers at a time), kickstarted together with batched Cobbler calls, then a single
+        ReadinessWatcher waits for all of them to boot. Hosts that fail to come up are replaced from the idle pool until
+        the reservation is filled or the pool runs dry.
         :param owner: who the reservation is for
         :param count: how many machines to reserve
         :param job_id: unique identifier for the reservation
         :param distro: what OS to install (see the global dict "distro" for valid options)
         :return:
         """
-        resources = self.host_manager.find_resources(field="state", value="idle")['_items']
-        if len(resources) < count:
+        try:
+            claimed = self.host_manager.claim_resources(count, owner=owner, job_id=job_id, state='pxe',
+                                                        lease=self.lease_seconds)
+        except RequestFailureException as e:
+            if e.response.status_code != 409:
+                raise
             print "Oops...There are not enough free resources to fill your request."
             return
 
-        for i in range(count):
-            hostname = resources[i]['hostname']
-            data = json.dumps({'hostname': hostname, 'owner': owner, 'state': 'pxe', 'job_id': job_id})
-            self.host_manager.update_resource(data)
-            self.put_file_on_target(ip=self.cobbler.get_system(hostname)['interfaces']['eth0']['ip_address'],
-                                    file_name=self.file_name)
-            print "kickstarting host: " + hostname
-            self.host_reservation.append(hostname)
-            self.kickstart_machine(system_name=hostname, distro=distro)
-
-        '''
-        Check that the resources in the reservation are ready
-        '''
-        print "Waiting 2 minutes for systems to boot"
-        sleep(120)
-        for resource in self.host_reservation:
-            print "Checking status of " + resource
-            if not self.is_system_ready(system_name=resource):
-                print "Host was not ready within allotted time. Attempting to allocate another machine."
-                self.host_reservation.remove(resource)
-                self.make_host_reservation(owner=owner, count=1, job_id=job_id, distro=distro)
-
-        print "Request fulfilled."
+        pending = [machine['hostname'] for machine in claimed]
+        reserved = []
+        pool = ThreadPool(processes=max(1, min(self.max_workers, count)))
+        try:
+            while pending:
+                ips = self._lookup_ips(pending)
+                located = [hostname for hostname in pending if hostname in ips]
+                prepared = pool.map(lambda hostname: self._prepare_host(hostname, ips[hostname]), located)
+                kickstarted = self._kickstart_hosts([hostname for hostname, ok in zip(located, prepared) if ok],
+                                                    distro)
+                kickstarted = dict((hostname, ips[hostname]) for hostname in kickstarted)
+                print "Waiting for {0} host(s) to boot".format(len(kickstarted))
+                ready = self._readiness_watcher(job_id=job_id).wait(kickstarted)
+                finished = pool.map(lambda hostname: self._finish_host(hostname, ready[hostname]), kickstarted.keys())
+                reserved.extend(hostname for hostname, in_use in zip(kickstarted.keys(), finished) if in_use)
+                failed = [hostname for hostname in pending if not ready.get(hostname)]
+                if not failed:
+                    break
+                print "{0} host(s) were not ready within allotted time. Attempting to allocate others." \
+                    .format(len(failed))
+                claimed = self.host_manager.claim_resources(len(failed), owner=owner, job_id=job_id, state='pxe',
+                                                            partial=True, lease=self.lease_seconds)
+                pending = [machine['hostname'] for machine in claimed]
+                if len(pending) < len(failed):
+                    print "Oops...There are not enough free resources to replace all failed hosts."
+        finally:
+            pool.close()
+            pool.join()
+            self.ssh_pool.close_all()
+
+        if len(reserved) == count:
+            print "Request fulfilled."
+        else:
+            print "Request not fulfilled: reserved {0} of {1} host(s).".format(len(reserved), count)
         return
 
+    def _lookup_ips(self, hostnames):
+        """
+        Look up the IPs of claimed hosts in Cobbler, marking the hosts it cannot return as failed.
+
+        :param hostnames: names of the claimed hosts
+        :return: (dict) hostname -> IP of the hosts that were found
+        """
+        try:
+            ips = self.cobbler.get_ips(hostnames)
+        except Exception as e:
+            print "Could not look up hosts in Cobbler: " + str(e)
+            ips = {}
+        for hostname in hostnames:
+            if hostname not in ips:
+                self._finish_host(hostname, False)
+        return ips
+
+    def _prepare_host(self, hostname, ip):
+        """
+        Seed the kickstart check file on a claimed host.
+
+        :param hostname: name of the claimed host
+        :param ip: IP of the host
+        :return: True if the host is ready to be kickstarted
+        """
+        try:
+            self.put_file_on_target(ip=ip, file_name=self.file_name)
+        except Exception as e:
+            print "Could not seed " + hostname + " for kickstart: " + str(e)
+            self._finish_host(hostname, False)
+            return False
+        return True
+
+    def _kickstart_hosts(self, hostnames, distro):
+        """
+        Kickstart prepared hosts, marking those Cobbler could not kickstart as failed.
+
+        :param hostnames: names of the hosts to kickstart
+        :param distro: what OS to install
+        :return: the hosts that were kickstarted
+        """
+        try:
+            print "kickstarting hosts: " + ", ".join(hostnames)
+            kickstarted = self.kickstart_machines(system_names=hostnames, distro=distro)
+        except Exception as e:
+            print "Kickstart failed: " + str(e)
+            kickstarted = []
+        for hostname in hostnames:
+            if hostname not in kickstarted:
+                self._finish_host(hostname, False)
+        return kickstarted
+
+    def _finish_host(self, hostname, ready):
+        """
+        Record the outcome of a kickstart in the DB: "in_use" for hosts that came up, "pxe_failed" (for later
+        cleanup) for those that did not.
+
+        :param hostname: name of the kickstarted host
+        :param ready: whether the host came up
+        :return: True if the host is now in use by the reservation
+        """
+        if ready:
+            print "Kickstart of " + hostname + " succeeded"
+            changes = {'state': 'in_use'}
+        else:
+            changes = {'owner': '', 'state': 'pxe_failed', 'job_id': ''}
+
+        def transition(machine):
+            # Leave the machine alone if it was freed or handed elsewhere while it was being kickstarted
+            if machine.get('state') != 'pxe':
+                return None
+            return changes
+
+        # Runs on the worker pool, an error here must not abort the other hosts
+        try:
+            machine = self.host_manager.compare_and_swap(hostname, transition)
+        except Exception as e:
+            print "Could not record the kickstart of " + hostname + ": " + str(e)
+            return False
+        if ready and machine.get('state') == 'in_use':
+            with self.reservation_lock:
+                self.host_reservation.append(hostname)
+            return True
+        return False
+
+    def _readiness_watcher(self, job_id=None):
+        """
+        Build a ReadinessWatcher for freshly kickstarted hosts. When a job_id is given, hosts whose kickstart %post
+        has already notified the resource manager are checked straight away.
+
+        :param job_id: reservation whose kickstart notifications should be followed
+        :return: ReadinessWatcher
+        """
+        def kickstarted_hosts():
+            resources = self.host_manager.iter_resources(where={'job_id': job_id, 'kickstarted': True},
+                                                         projection=['hostname'])
+            return [resource['hostname'] for resource in resources]
+
+        return ReadinessWatcher(login_check=self.check_kickstarted,
+                                push_source=kickstarted_hosts if job_id else None)
+
     def kickstart_machine(self, system_name, distro):
         """
         Kickstart machine with specified OS
@@ -115,15 +256,20 @@ class PxeManager(object):
         :param distro:
         :return:
         """
-        system_handle = self.cobbler.get_system_handle(system_name, self.token)
-        self.cobbler.modify_system(system_handle, "profile", self.distro[distro], self.token)
-        self.cobbler.modify_system(system_handle, "netboot-enabled", 1, self.token)
-        self.cobbler.save_system(system_handle, self.token)
-
-        reboot_args = {"power": "reboot", "systems": [system_name]}
-        self.cobbler.background_power_system(reboot_args, self.token)
+        self.kickstart_machines(system_names=[system_name], distro=distro)
         return
 
+    def kickstart_machines(self, system_names, distro):
+        """
+        Kickstart several machines with specified OS. The Cobbler calls for all of them are batched and a single
+        power request reboots them together.
+
+        :param system_names: list of system names
+        :param distro:
+        :return: list of the systems that were kickstarted
+        """
+        return self.cobbler.kickstart(system_names, self.distro[distro])
+
     def is_system_ready(self, system_name):
         """
         Check that a given system can be reached via ssh after it is kickstarted. If it cannot be reached we will
@@ -134,18 +280,25 @@ class PxeManager(object):
         :param system_name: name of the system to check
         :return:
         """
-        sys_ip = self.cobbler.get_system(system_name)['interfaces']['eth0']['ip_address']
-        if self.check_ssh(ip=sys_ip):
-            if self.check_for_file_on_target(ip=sys_ip, file_name=self.file_name):
-                return False
-            print "File presence not detected. Kickstart succeeded"
-            data = json.dumps({'hostname': system_name, 'state': 'in_use'})
-            self.host_manager.update_resource(data)
-            return True
-        else:
-            data = json.dumps({'hostname': system_name, 'owner': '', 'state': 'pxe_failed', 'job_id': ''})
-            self.host_manager.update_resource(data)
-        return False
+        sys_ip = self.cobbler.get_ip(system_name)
+        ready = self._readiness_watcher().wait({system_name: sys_ip})[system_name]
+        self._finish_host(system_name, ready)
+        return ready
+
+    def check_kickstarted(self, ip):
+        """
+        Login check used while waiting for a kickstarted host. Until the host reboots the old install still answers
+        ssh and still has the file placed there before kickstart, so the host only counts as ready once we can log in
+        and that file is gone.
+
+        :param ip: (string) IP of a host
+        :return: True if the host has been reinstalled and accepts ssh logins
+        """
+        try:
+            return not self.check_for_file_on_target(ip=ip, file_name=self.file_name)
+        except (BadHostKeyException, AuthenticationException, SSHException, socket.error) as e:
+            print e
+            return False
 
     def free_machines(self, field, value):
         """
@@ -155,14 +308,48 @@ class PxeManager(object):
         :param value:
         :return:
         """
-        resources = self.host_manager.find_resources(field=field, value=value)['_items']
-        for resource in resources:
-            system_name = resource['hostname']
-            print "Freeing " + system_name
-            data = json.dumps({'hostname': system_name, 'owner': '', 'state': 'idle', 'job_id': ''})
-            self.host_manager.update_resource(data)
+        self._free_resources(self.host_manager, {field: value},
+                             {'owner': '', 'state': 'idle', 'job_id': '', 'lease_expires': None})
         return
 
+    def renew_reservation(self, job_id, lease_seconds=None):
+        """
+        Push back the leases of a reservation's machines and addresses. Leases exist so that reservations leaked by
+        crashed jobs are reclaimed, a job that holds its reservation for longer than lease_seconds has to call this
+        before they expire or the resource manager hands its machines and addresses to others.
+
+        :param job_id: reservation to renew
+        :param lease_seconds: (int) seconds from now until the new expiry, defaults to the manager's lease_seconds
+        :return: (int) number of resources renewed
+        """
+        lease = self.lease_seconds if lease_seconds is None else lease_seconds
+        renewed = self._renew_resources(self.host_manager, {'job_id': job_id}, lease)
+        for ip_manager in (self.public_ip_manager, self.private_ip_manager):
+            # Pool allocations carry no lease
+            if not isinstance(ip_manager, IPPoolClient):
+                renewed += self._renew_resources(ip_manager, {'owner': job_id}, lease)
+        return renewed
+
+    @staticmethod
+    def _renew_resources(manager, where, lease):
+        renewed = 0
+        for page in manager.iter_pages(where=where, projection=[manager.key]):
+            result = manager.renew_leases(page, lease)
+            for name, error in result['failed']:
+                print "Could not renew the lease of " + name + ": " + str(error)
+            renewed += len(result['succeeded'])
+        return renewed
+
+    @staticmethod
+    def _free_resources(manager, where, data):
+        # Each page is freed as it arrives while the next one is fetched
+        for page in manager.iter_pages(where=where, projection=[manager.key]):
+            result = manager.update_resources(page, data)
+            for name in result['succeeded']:
+                print "Freed " + name
+            for name, error in result['failed']:
+                print "Could not free " + name + ": " + str(error)
+
     def put_file_on_target(self, ip, file_name):
         """
         SSH to a host and touch a file there. We can later check for this files existence to determine whether a
@@ -172,11 +359,9 @@ class PxeManager(object):
         :param file_name: name of file to create
         :return:
         """
-        ssh = SSHClient()
-        ssh.set_missing_host_key_policy(AutoAddPolicy())  # wont require saying 'yes' to new fingerprint
-        ssh.connect(ip, username=self.ssh_user, password=self.ssh_password)
-        ssh.exec_command('touch ' + file_name)
-        ssh.close()
+        self._run_command(ip, 'touch ' + file_name)
+        # The host is about to be rebooted, so its connection is of no further use
+        self.ssh_pool.discard(ip, self.ssh_user)
         return
 
     def check_for_file_on_target(self, ip, file_name):
@@ -187,36 +372,28 @@ class PxeManager(object):
         :param file_name: Name of file to check if it exists
         :return: True if the file was found
         """
-        ssh = SSHClient()
-        ssh.set_missing_host_key_policy(AutoAddPolicy())  # wont require saying 'yes' to new fingerprint
-        ssh.connect(ip, username=self.ssh_user, password=self.ssh_password)
         command = "[ -f /root/" + file_name + " ] && echo OK"
-        _, stdout, _ = ssh.exec_command(command)
-        if stdout.read():
-            ssh.close()
+        if self._run_command(ip, command):
             print "Found a file that should not have been on the host"
+            # Still the install from before the kickstart, its connection dies with the reboot
+            self.ssh_pool.discard(ip, self.ssh_user)
             return True
-        ssh.close()
         return False
 
     def check_ssh(self, ip, interval=20, retries=45):
         """
-        Attempt to ssh to a given host. Default is to try for 15 minutes
+        Attempt to ssh to a given host. Default is to try for 15 minutes. The connection is kept in the ssh pool for
+        the commands that follow.
 
         :param ip: ip of host to try
-        :param user: user to log in as
-        :param password: user login password
         :param interval: seconds between retries
         :param retries: number of retries
         :return:
         """
-        ssh = SSHClient()
-        ssh.set_missing_host_key_policy(AutoAddPolicy())
-
         for i in range(retries):
             try:
                 print "Attempting ssh to " + ip + "....." + str(i+1) + "/" + str(retries)
-                ssh.connect(ip, username=self.ssh_user, password=self.ssh_password)
+                self.ssh_pool.get(ip, self.ssh_user, self.ssh_password)
                 print "Obtained ssh connection to " + ip + "!"
                 return True
             except (BadHostKeyException, AuthenticationException, SSHException, socket.error) as e:
@@ -224,6 +401,23 @@ class PxeManager(object):
                 sleep(interval)
         return False
 
+    def _run_command(self, ip, command):
+        """
+        Run a command over the pooled ssh connection to a host. A connection that breaks is dropped from the pool so
+        that the next call reconnects.
+
+        :param ip: (string) IP of a host
+        :param command: command to run
+        :return: the command's output
+        """
+        with self.ssh_pool.checkout(ip, self.ssh_user, self.ssh_password) as ssh:
+            try:
+                _, stdout, _ = ssh.exec_command(command)
+                return stdout.read()
+            except (SSHException, socket.error):
+                self.ssh_pool.discard(ip, self.ssh_user)
+                raise
+
     def get_host_reservation_as_ip(self, reservation):
         """
         Will lookup IP of a given hostname in cobbler server.
@@ -231,10 +425,8 @@ class PxeManager(object):
         :param reservation: An array of hostnames to get IPs of
         :return: An array of IPs
         """
-        reservation_ips = []
-        for item in reservation:
-            reservation_ips.append(self.cobbler.get_system(item)['interfaces']['eth0']['ip_address'])
-        return reservation_ips
+        ips = self.cobbler.get_ips(reservation)
+        return [ips[item] for item in reservation]
 
     def make_ip_reservation(self, ip_type, job_id, number_of_ips):
         """
@@ -255,16 +447,43 @@ class PxeManager(object):
         reservation_dict = {'public': self.public_ip_reservation,
                             'private': self.private_ip_reservation}
         ip_manager = type_dict[ip_type]
-        resources = ip_manager.find_resources(field="owner", value="")['_items']
-        if len(resources) < number_of_ips:
+        if isinstance(ip_manager, IPPoolClient):
+            try:
+                reservation_dict[ip_type].extend(ip_manager.allocate(number_of_ips, job_id))
+            except RequestFailureException as e:
+                if e.response.status_code != 409:
+                    raise
+                print "Oops...There are not enough free IPs to fill your request."
+                return
+            return reservation_dict[ip_type]
+
+        # Addresses taken by someone else between the read and the update fail with a 412, they are replaced from a
+        # fresh read of the free addresses until the reservation is filled or none are left. Reserved addresses no
+        # longer match owner='', only the failed ones have to be kept out of the next read.
+        reserved = []
+        failed = []
+        while len(reserved) < number_of_ips:
+            query = Query(owner='').limit(number_of_ips - len(reserved))
+            if failed:
+                query.not_in('address', failed)
+            resources = list(ip_manager.iter_resources(where=query, projection=['address']))
+            if not resources:
+                break
+            result = ip_manager.update_resources(resources,
+                                                 {'owner': job_id,
+                                                  'lease_expires': ip_manager.lease_expiry(self.lease_seconds)})
+            for address, error in result['failed']:
+                print "Could not reserve " + address + ": " + str(error)
+                failed.append(address)
+            reserved.extend(result['succeeded'])
+
+        if len(reserved) < number_of_ips:
             print "Oops...There are not enough free IPs to fill your request."
+            if reserved:
+                self._free_resources(ip_manager, Query(owner=job_id).is_in('address', reserved),
+                                     {'owner': '', 'lease_expires': None})
             return
-
-        for i in range(number_of_ips):
-            address = resources[i]['address']
-            data = json.dumps({'address': address, 'owner': job_id})
-            ip_manager.update_resource(data)
-            reservation_dict[ip_type].append(address)
+        reservation_dict[ip_type].extend(reserved)
         return reservation_dict[ip_type]
 
     def free_ip_reservation(self, ip_type, field="owner", value=""):
@@ -283,11 +502,16 @@ class PxeManager(object):
         """
         type_dict = {'public': self.public_ip_manager,
                      'private': self.private_ip_manager}
-        ip_type = type_dict[ip_type]
-        resources = ip_type.find_resources(field=field, value=value)['_items']
-        for resource in resources:
-            address = resource['address']
-            print "Freeing " + address
-            data = json.dumps({'address': address, 'owner': ''})
-            ip_type.update_resource(data)
+        ip_manager = type_dict[ip_type]
+        if isinstance(ip_manager, IPPoolClient):
+            if not value:
+                raise ValueError('An owner or address to free is required')
+            if field == 'address':
+                freed = ip_manager.free(addresses=[value])
+            else:
+                freed = ip_manager.free(owner=value)
+            for first, last in freed:
+                print "Freed " + (first if first == last else first + "-" + last)
+            return
+        self._free_resources(ip_manager, {field: value}, {'owner': '', 'lease_expires': None})
         return
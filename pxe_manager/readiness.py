@@ -0,0 +1,211 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009-2014, Eucalyptus Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use of this software in source and binary forms, with or
+# without modification, are permitted provided that the following conditions
+# are met:
+#
+# Redistributions of source code must retain the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import errno
+import random
+import select
+import socket
+import time
+from multiprocessing.pool import ThreadPool
+
+# Seconds between checks on running logins while nothing else wakes the loop
+LOGIN_POLL_INTERVAL = 0.1
+
+
+class ReadinessWatcher(object):
+    def __init__(self, login_check, port=22, timeout=900, initial_delay=10, max_delay=15, connect_timeout=3,
+                 jitter=0.2, push_source=None, push_interval=5, login_workers=8, login_timeout=120):
+        """
+        Waits for a group of kickstarted hosts to come back up. Every pending host gets a cheap non-blocking TCP
+        probe of its ssh port, all of them multiplexed through one select() loop, with exponential backoff and
+        jitter between attempts. The login check is only run once the port accepts connections, on a small pool of
+        workers so that a slow login does not hold up the probes of the other hosts.
+
+        :param login_check: (callable) takes an IP and returns True when the host is ready to hand over
+        :param port: (int) port to probe
+        :param timeout: (int) seconds to wait for all hosts before giving up on the stragglers
+        :param initial_delay: (int) seconds before the first probe of each host
+        :param max_delay: (int) upper bound on the backoff between probes of one host
+        :param connect_timeout: (int) seconds a single probe may take before it counts as failed
+        :param jitter: (float) fraction by which each backoff delay is randomly stretched or shortened
+        :param push_source: (callable) optional, returns the names of hosts that announced themselves (for example
+                            from the kickstart %post). Those hosts skip straight to the login check, backing off
+                            between failed logins like the probes do.
+        :param push_interval: (int) seconds between calls to push_source
+        :param login_workers: (int) login checks run at once
+        :param login_timeout: (int) seconds a login check may take before it counts as failed. The check itself is
+                              not interrupted, login_check should time out on its own as well.
+        """
+        self.login_check = login_check
+        self.port = port
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.connect_timeout = connect_timeout
+        self.jitter = jitter
+        self.push_source = push_source
+        self.push_interval = push_interval
+        self.login_workers = login_workers
+        self.login_timeout = login_timeout
+
+    def wait(self, hosts):
+        """
+        Block until every host is ready or the timeout expires.
+
+        :param hosts: (dict) host name -> IP address
+        :return: (dict) host name -> True if the host became ready in time
+        """
+        now = time.time()
+        deadline = now + self.timeout
+        results = dict((name, False) for name in hosts)
+        delays = dict((name, self.initial_delay) for name in hosts)
+        next_probe = dict((name, now + self.initial_delay) for name in hosts)
+        probes = {}
+        next_push = now
+        next_pushed_login = {}
+        # host name -> (AsyncResult of its login check, start time)
+        logins = {}
+        abandoned = []
+        pool = ThreadPool(processes=max(1, min(self.login_workers, len(hosts))))
+
+        def escalate(name):
+            logins[name] = (pool.apply_async(self._escalate, (name, hosts[name])), time.time())
+
+        def login_failed(name):
+            self._backoff(name, delays, next_probe)
+            next_pushed_login[name] = next_probe[name]
+
+        try:
+            while (next_probe or probes or logins) and now < deadline:
+                if self.push_source and now >= next_push:
+                    for name in self._pushed_hosts():
+                        if name not in next_probe or now < next_pushed_login.get(name, now):
+                            continue
+                        next_probe.pop(name)
+                        escalate(name)
+                    next_push = now + self.push_interval
+
+                for name in [name for name, when in next_probe.items() if when <= now]:
+                    next_probe.pop(name)
+                    sock, connected = self._start_probe(hosts[name])
+                    if sock:
+                        probes[sock] = (name, now)
+                    elif connected:
+                        escalate(name)
+                    else:
+                        self._backoff(name, delays, next_probe)
+                if not (next_probe or probes or logins):
+                    break
+
+                wakeups = [deadline] + next_probe.values() + [started + self.connect_timeout
+                                                              for _, started in probes.values()]
+                if self.push_source:
+                    wakeups.append(next_push)
+                if logins:
+                    wakeups.append(now + LOGIN_POLL_INTERVAL)
+                wait_time = max(0, min(wakeups) - time.time())
+                if probes:
+                    _, writable, errored = select.select([], probes.keys(), probes.keys(), wait_time)
+                else:
+                    time.sleep(wait_time)
+                    writable, errored = [], []
+
+                now = time.time()
+                for sock in probes.keys():
+                    name, started = probes[sock]
+                    if sock in writable or sock in errored:
+                        port_open = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                    elif now - started >= self.connect_timeout:
+                        port_open = False
+                    else:
+                        continue
+                    sock.close()
+                    probes.pop(sock)
+                    if port_open:
+                        escalate(name)
+                    else:
+                        self._backoff(name, delays, next_probe)
+
+                for name in logins.keys():
+                    login, started = logins[name]
+                    if login.ready():
+                        logins.pop(name)
+                        if login.get():
+                            results[name] = True
+                        else:
+                            login_failed(name)
+                    elif now - started >= self.login_timeout:
+                        print "Login to " + name + " timed out"
+                        abandoned.append(logins.pop(name)[0])
+                        login_failed(name)
+                now = time.time()
+        finally:
+            for sock in probes:
+                sock.close()
+            pool.close()
+            # A login that hangs must not hold up the caller past the deadline
+            if not logins and all(login.ready() for login in abandoned):
+                pool.join()
+        return results
+
+    def _start_probe(self, ip):
+        """
+        Begin a non-blocking connect to the host's port.
+
+        :return: (socket, connected) the socket is None if the connect already finished, in which case connected
+                 says whether it succeeded
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(0)
+        err = sock.connect_ex((ip, self.port))
+        if err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            return sock, False
+        sock.close()
+        return None, err == 0
+
+    def _escalate(self, name, ip):
+        print "Port " + str(self.port) + " open on " + name + ", attempting login"
+        try:
+            return self.login_check(ip)
+        except Exception as e:
+            print e
+            return False
+
+    def _backoff(self, name, delays, next_probe):
+        delays[name] = min(max(delays[name], 1) * 2, self.max_delay)
+        stretch = 1 + random.uniform(-self.jitter, self.jitter)
+        next_probe[name] = time.time() + delays[name] * stretch
+
+    def _pushed_hosts(self):
+        try:
+            return self.push_source() or []
+        except Exception as e:
+            print "Could not read pushed host notifications: " + str(e)
+            return []
@@ -0,0 +1,174 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009-2014, Eucalyptus Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use of this software in source and binary forms, with or
+# without modification, are permitted provided that the following conditions
+# are met:
+#
+# Redistributions of source code must retain the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above
+#   copyright notice, this list of conditions and the
+#   following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import threading
+import time
+from contextlib import contextmanager
+
+from paramiko import SSHClient, AutoAddPolicy
+
+
+class SSHConnectionPool(object):
+    def __init__(self, max_connections=64, idle_timeout=300, connect_timeout=10, banner_timeout=30, auth_timeout=30):
+        """
+        Keeps authenticated ssh connections around, keyed by (ip, user), so that consecutive commands against a host
+        share one transport instead of redoing the handshake and login each time. Connections are shared rather than
+        exclusively checked out; paramiko multiplexes concurrent commands over a single transport. While a caller
+        holds a connection through checkout() it is never closed by eviction or expiry.
+
+        :param max_connections: (int) most connections kept open at once, the least recently used one that is not
+                                checked out is closed to make room for a new one
+        :param idle_timeout: (int) seconds a connection may sit unused before it is closed
+        :param connect_timeout: (int) seconds the TCP connect to a host may take
+        :param banner_timeout: (int) seconds to wait for the host's ssh banner, a half booted host may accept the
+                               connection and never send one
+        :param auth_timeout: (int) seconds to wait for the login to be accepted or refused
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.banner_timeout = banner_timeout
+        self.auth_timeout = auth_timeout
+        # (ip, user) -> [client, last used, number of checkouts]
+        self._connections = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+
+    def get(self, ip, username, password):
+        """
+        Return an open connection to a host, connecting if there is no usable one in the pool. The connection is not
+        checked out, use checkout() to run commands over it.
+
+        :param ip: (string) IP of host
+        :param username: (string) user to log in as
+        :param password: (string) password for user
+        :return: connected SSHClient
+        """
+        return self._acquire((ip, username), password, 0)[0]
+
+    @contextmanager
+    def checkout(self, ip, username, password):
+        """
+        Context manager holding an open connection to a host for the duration of the block, see get().
+        """
+        key = (ip, username)
+        entry = self._acquire(key, password, 1)
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] = time.time()
+                entry[2] -= 1
+                if not entry[2] and self._connections.get(key) is not entry:
+                    # Discarded while checked out
+                    entry[0].close()
+
+    def _acquire(self, key, password, checkouts):
+        with self._lock:
+            self._expire_idle()
+            entry = self._connections.get(key)
+            if entry and self._is_active(entry[0]):
+                self.hits += 1
+                entry[1] = time.time()
+                entry[2] += checkouts
+                return entry
+            if entry:
+                self._close(key)
+            self.misses += 1
+
+        client = SSHClient()
+        client.set_missing_host_key_policy(AutoAddPolicy())  # wont require saying 'yes' to new fingerprint
+        started = time.time()
+        try:
+            client.connect(key[0], username=key[1], password=password, timeout=self.connect_timeout,
+                           banner_timeout=self.banner_timeout, auth_timeout=self.auth_timeout)
+        except Exception:
+            client.close()
+            raise
+        elapsed = time.time() - started
+
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_seconds += elapsed
+            entry = self._connections.get(key)
+            if entry:
+                # Another thread connected to the same host meanwhile, keep its connection
+                client.close()
+                entry[2] += checkouts
+                return entry
+            idle = [k for k, e in self._connections.items() if not e[2]]
+            if len(self._connections) >= self.max_connections and idle:
+                self._close(min(idle, key=lambda k: self._connections[k][1]))
+            entry = [client, time.time(), checkouts]
+            self._connections[key] = entry
+        return entry
+
+    def discard(self, ip, username):
+        """
+        Close and forget the connection to a host, e.g. because it is about to reboot.
+        """
+        with self._lock:
+            self._close((ip, username))
+
+    def close_all(self):
+        with self._lock:
+            for key in self._connections.keys():
+                self._close(key)
+
+    def stats(self):
+        """
+        :return: (dict) pool hit/miss counters and handshake latency
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'handshakes': self.handshakes,
+                    'handshake_seconds': self.handshake_seconds,
+                    'average_handshake_seconds': self.handshake_seconds / self.handshakes if self.handshakes else 0.0,
+                    'open_connections': len(self._connections)}
+
+    def _expire_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        for key in [key for key, entry in self._connections.items() if entry[1] < cutoff and not entry[2]]:
+            self._close(key)
+
+    def _close(self, key):
+        entry = self._connections.pop(key, None)
+        # A checked out connection is closed by checkout() once it is handed back
+        if entry and not entry[2]:
+            entry[0].close()
+
+    @staticmethod
+    def _is_active(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
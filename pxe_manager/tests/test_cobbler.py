@@ -0,0 +1,168 @@
+import xmlrpclib
+
+import httpretty
+
+from pxe_manager.cobbler import CobblerClient
+
+COBBLER_URL = "http://cobbler.example.com/cobbler_api"
+
+
+class FakeCobbler(object):
+    def __init__(self, multicall=True, systems=(), broken=()):
+        self.multicall = multicall
+        self.systems = list(systems)
+        self.broken = list(broken)
+        self.mtime = 1.0
+        self.requests = []
+        self.saved = []
+        self.powered = []
+
+    def login(self, user, password):
+        return 'token'
+
+    def get_system(self, name):
+        self._check(name)
+        return {'name': name, 'interfaces': {'eth0': {'ip_address': '10.0.0.' + name[-1]}}}
+
+    def get_systems(self):
+        return [self.get_system(name) for name in self.systems]
+
+    def last_modified_time(self):
+        return self.mtime
+
+    def get_system_handle(self, name, token):
+        return 'handle-' + name
+
+    def modify_system(self, handle, key, value, token):
+        self._check(handle)
+        return True
+
+    def save_system(self, handle, token):
+        self.saved.append(handle)
+        return True
+
+    def background_power_system(self, args, token):
+        self.powered.append(args['systems'])
+        return 'task'
+
+    def _check(self, name):
+        for broken in self.broken:
+            if name.endswith(broken):
+                raise xmlrpclib.Fault(1, 'no such system: ' + broken)
+
+    def _multicall(self, call):
+        try:
+            return [getattr(self, call['methodName'])(*call['params'])]
+        except xmlrpclib.Fault as fault:
+            return {'faultCode': fault.faultCode, 'faultString': fault.faultString}
+
+    def __call__(self, request, uri, headers):
+        params, method = xmlrpclib.loads(request.body)
+        self.requests.append(method)
+        try:
+            if method == 'system.multicall':
+                if not self.multicall:
+                    raise xmlrpclib.Fault(1, 'method "system.multicall" is not supported')
+                result = [self._multicall(call) for call in params[0]]
+            else:
+                result = getattr(self, method)(*params)
+            body = xmlrpclib.dumps((result,), methodresponse=True, allow_none=True)
+        except xmlrpclib.Fault as fault:
+            body = xmlrpclib.dumps(fault, methodresponse=True)
+        return 200, headers, body
+
+
+def _client(fake):
+    httpretty.register_uri(httpretty.POST, COBBLER_URL, body=fake)
+    return CobblerClient(COBBLER_URL, 'user', 'password')
+
+
+@httpretty.activate
+def test_kickstart_is_batched():
+    fake = FakeCobbler()
+    client = _client(fake)
+    hosts = ['host' + str(i) for i in range(5)]
+    client.kickstart(hosts, 'profile')
+    assert fake.requests == ['login', 'system.multicall', 'system.multicall', 'system.multicall',
+                             'background_power_system']
+    assert fake.saved == ['handle-' + host for host in hosts]
+    assert fake.powered == [hosts]
+
+
+@httpretty.activate
+def test_get_ips_served_from_inventory():
+    fake = FakeCobbler(systems=['host1', 'host2'])
+    client = _client(fake)
+    assert client.get_ips(['host1', 'host2']) == {'host1': '10.0.0.1', 'host2': '10.0.0.2'}
+    assert client.get_ip('host1') == '10.0.0.1'
+    assert fake.requests == ['login', 'last_modified_time', 'get_systems']
+
+
+@httpretty.activate
+def test_missing_systems_are_batched():
+    fake = FakeCobbler()
+    client = _client(fake)
+    assert client.get_ips(['host1', 'host2']) == {'host1': '10.0.0.1', 'host2': '10.0.0.2'}
+    assert fake.requests == ['login', 'last_modified_time', 'get_systems', 'system.multicall']
+
+
+@httpretty.activate
+def test_inventory_reloaded_only_when_changed():
+    fake = FakeCobbler(systems=['host1'])
+    client = _client(fake)
+    client.inventory_ttl = -1
+    client.get_ip('host1')
+    client.get_ip('host1')
+    assert fake.requests.count('get_systems') == 1
+    fake.mtime = 2.0
+    client.get_ip('host1')
+    assert fake.requests.count('get_systems') == 2
+
+
+@httpretty.activate
+def test_kickstart_invalidates_systems():
+    fake = FakeCobbler(systems=['host1', 'host2'])
+    client = _client(fake)
+    client.get_ips(['host1', 'host2'])
+    client.kickstart(['host1'], 'profile')
+    del fake.requests[:]
+    client.get_ips(['host1', 'host2'])
+    assert fake.requests == ['system.multicall']
+
+
+@httpretty.activate
+def test_falls_back_without_multicall():
+    fake = FakeCobbler(multicall=False)
+    client = _client(fake)
+    assert client.get_ips(['host1', 'host2']) == {'host1': '10.0.0.1', 'host2': '10.0.0.2'}
+    assert fake.requests[-3:] == ['system.multicall', 'get_system', 'get_system']
+    assert not client.multicall_supported
+
+
+@httpretty.activate
+def test_kickstart_failure_is_per_system():
+    fake = FakeCobbler(broken=['host1'])
+    client = _client(fake)
+    assert client.kickstart(['host0', 'host1', 'host2'], 'profile') == ['host0', 'host2']
+    assert fake.saved == ['handle-host0', 'handle-host2']
+    assert fake.powered == [['host0', 'host2']]
+
+
+@httpretty.activate
+def test_get_ips_skips_failed_systems():
+    fake = FakeCobbler(broken=['host2'])
+    client = _client(fake)
+    assert client.get_ips(['host1', 'host2']) == {'host1': '10.0.0.1'}
+    try:
+        client.get_ip('host2')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError('A system Cobbler cannot return should raise')
+
+
+@httpretty.activate
+def test_fallback_failure_is_per_system():
+    fake = FakeCobbler(multicall=False, broken=['host2'])
+    client = _client(fake)
+    assert client.get_ips(['host1', 'host2']) == {'host1': '10.0.0.1'}
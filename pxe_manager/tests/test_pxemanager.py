@@ -1,6 +1,8 @@
 from pxe_manager.pxemanager import PxeManager
-from resource_manager.client import ResourceManagerClient
+from resource_manager.client import IPPoolClient, ResourceManagerClient
 import httpretty
+import json
+import mock
 
 
 @httpretty.activate
@@ -29,3 +31,172 @@ def test_defaults():
     pxe_manager = PxeManager(cobbler_url, cobbler_user, cobbler_password, host_client, pub_ip_client, priv_ip_client)
     for key, value in distro_map.iteritems():
         assert pxe_manager.distro[key] == value
+
+
+def _pxe_manager():
+    with mock.patch('xmlrpclib.ServerProxy.__getattr__'):
+        return PxeManager("http://cobbler.example.com/cobbler_api", "user", "password",
+                          mock.Mock(), mock.Mock(), mock.Mock(), max_workers=4)
+
+
+def test_make_host_reservation_replaces_failed_hosts():
+    pxe_manager = _pxe_manager()
+    idle = [{'hostname': 'host' + str(i)} for i in range(4)]
+    pxe_manager.host_manager.claim_resources.side_effect = [idle[:3], idle[3:]]
+    ready = {'host0': True, 'host1': False, 'host2': True, 'host3': True}
+    watcher = mock.Mock()
+    watcher.wait.side_effect = lambda hosts: dict((hostname, ready[hostname]) for hostname in hosts)
+    pxe_manager.cobbler = mock.Mock()
+    pxe_manager.cobbler.get_ips.side_effect = lambda hostnames: dict((hostname, hostname + '-ip')
+                                                                     for hostname in hostnames)
+    pxe_manager.cobbler.kickstart.side_effect = lambda hostnames, profile: hostnames
+    with mock.patch.object(pxe_manager, '_prepare_host', return_value=True), \
+            mock.patch.object(pxe_manager, '_readiness_watcher', return_value=watcher), \
+            mock.patch.object(pxe_manager, '_finish_host', side_effect=lambda hostname, up: up) as finish:
+        pxe_manager.make_host_reservation(owner='tony', count=3, job_id='job', distro='centos')
+    finished = sorted(call[0] for call in finish.call_args_list)
+    assert finished == [('host0', True), ('host1', False), ('host2', True), ('host3', True)]
+    assert pxe_manager.cobbler.kickstart.call_count == 2
+
+
+def test_make_host_reservation_fails_only_hosts_cobbler_rejects():
+    pxe_manager = _pxe_manager()
+    pxe_manager.host_manager.claim_resources.side_effect = [[{'hostname': 'host0'}, {'hostname': 'host1'},
+                                                             {'hostname': 'host2'}], []]
+    watcher = mock.Mock()
+    watcher.wait.side_effect = lambda hosts: dict((hostname, True) for hostname in hosts)
+    pxe_manager.cobbler = mock.Mock()
+    pxe_manager.cobbler.get_ips.return_value = {'host0': 'ip0', 'host1': 'ip1'}
+    pxe_manager.cobbler.kickstart.side_effect = lambda hostnames, profile: hostnames[1:]
+    with mock.patch.object(pxe_manager, '_prepare_host', return_value=True), \
+            mock.patch.object(pxe_manager, '_readiness_watcher', return_value=watcher), \
+            mock.patch.object(pxe_manager, '_finish_host', side_effect=lambda hostname, up: up) as finish:
+        pxe_manager.make_host_reservation(owner='tony', count=3, job_id='job', distro='centos')
+    assert pxe_manager.cobbler.kickstart.call_args[0][0] == ['host0', 'host1']
+    finished = sorted(call[0] for call in finish.call_args_list)
+    assert finished == [('host0', False), ('host1', True), ('host2', False)]
+
+
+def test_free_machines_by_page():
+    pxe_manager = _pxe_manager()
+    pxe_manager.host_manager.key = 'hostname'
+    pages = [[{'hostname': 'host0'}, {'hostname': 'host1'}], [{'hostname': 'host2'}]]
+    pxe_manager.host_manager.iter_pages.return_value = iter(pages)
+    pxe_manager.host_manager.update_resources.side_effect = lambda page, data: {
+        'succeeded': [resource['hostname'] for resource in page], 'failed': []}
+    pxe_manager.free_machines(field='job_id', value='job')
+    pxe_manager.host_manager.iter_pages.assert_called_once_with(where={'job_id': 'job'},
+                                                                projection=['hostname'])
+    updates = pxe_manager.host_manager.update_resources.call_args_list
+    assert [call[0][0] for call in updates] == pages
+    assert updates[0][0][1] == {'owner': '', 'state': 'idle', 'job_id': '', 'lease_expires': None}
+
+
+def test_finish_host_only_moves_machines_out_of_pxe():
+    pxe_manager = _pxe_manager()
+    transitions = []
+
+    def compare_and_swap(hostname, mutate):
+        machine = {'hostname': hostname, 'state': 'pxe' if hostname != 'freed' else 'idle'}
+        changes = mutate(machine)
+        transitions.append((hostname, changes))
+        return dict(machine, **(changes or {}))
+    pxe_manager.host_manager.compare_and_swap.side_effect = compare_and_swap
+    pxe_manager._finish_host('host0', True)
+    pxe_manager._finish_host('host1', False)
+    pxe_manager._finish_host('freed', True)
+    assert transitions == [('host0', {'state': 'in_use'}),
+                           ('host1', {'owner': '', 'state': 'pxe_failed', 'job_id': ''}),
+                           ('freed', None)]
+    assert pxe_manager.host_reservation == ['host0']
+
+
+def test_finish_host_survives_errors():
+    pxe_manager = _pxe_manager()
+    pxe_manager.host_manager.compare_and_swap.side_effect = IOError('connection reset')
+    assert pxe_manager._finish_host('host0', False) is False
+    assert pxe_manager._finish_host('host1', True) is False
+    assert pxe_manager.host_reservation == []
+
+
+def test_ip_reservation_from_pool():
+    pxe_manager = _pxe_manager()
+    pxe_manager.public_ip_manager = mock.Mock(spec=IPPoolClient)
+    pxe_manager.public_ip_manager.allocate.return_value = ['10.0.0.1', '10.0.0.2']
+    assert pxe_manager.make_ip_reservation('public', 'job-1', 2) == ['10.0.0.1', '10.0.0.2']
+    pxe_manager.public_ip_manager.allocate.assert_called_once_with(2, 'job-1')
+    pxe_manager.public_ip_manager.free.return_value = [['10.0.0.1', '10.0.0.2']]
+    pxe_manager.free_ip_reservation('public', value='job-1')
+    pxe_manager.public_ip_manager.free.assert_called_once_with(owner='job-1')
+    try:
+        pxe_manager.free_ip_reservation('public')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Freeing without a value should fail')
+    assert pxe_manager.public_ip_manager.free.call_count == 1
+
+
+def _free_address_manager(free, taken):
+    """
+    Mock address manager handing out the free addresses, reserving any in taken fails like a lost race (412).
+    """
+    manager = mock.Mock()
+    manager.key = 'address'
+
+    owners = dict((address, '') for address in free)
+    manager.queries = []
+
+    def iter_resources(where, projection):
+        manager.queries.append(where.compile())
+        excluded = where.where.get('address', {}).get('$nin', [])
+        return iter([{'address': address} for address in free
+                     if not owners[address] and address not in excluded][:where.max_results])
+
+    def update_resources(resources, data):
+        addresses = [resource['address'] for resource in resources]
+        for address in addresses:
+            if address not in taken:
+                owners[address] = data['owner']
+        return {'succeeded': [address for address in addresses if address not in taken],
+                'failed': [(address, 'precondition failed') for address in addresses if address in taken]}
+    manager.iter_resources.side_effect = iter_resources
+    manager.update_resources.side_effect = update_resources
+    return manager
+
+
+def test_ip_reservation_replaces_lost_addresses():
+    pxe_manager = _pxe_manager()
+    pxe_manager.public_ip_manager = _free_address_manager(['10.0.0.1', '10.0.0.2', '10.0.0.3'], ['10.0.0.2'])
+    assert pxe_manager.make_ip_reservation('public', 'job-1', 2) == ['10.0.0.1', '10.0.0.3']
+    assert pxe_manager.public_ip_manager.update_resources.call_count == 2
+    queries = [json.loads(query) for query in pxe_manager.public_ip_manager.queries]
+    assert queries == [{'owner': ''}, {'owner': '', 'address': {'$nin': ['10.0.0.2']}}]
+
+
+def test_ip_reservation_short_is_released():
+    pxe_manager = _pxe_manager()
+    pxe_manager.public_ip_manager = _free_address_manager(['10.0.0.1', '10.0.0.2'], ['10.0.0.2'])
+    pxe_manager.public_ip_manager.iter_pages.return_value = iter([[{'address': '10.0.0.1'}]])
+    assert pxe_manager.make_ip_reservation('public', 'job-1', 2) is None
+    assert pxe_manager.public_ip_reservation == []
+    where = pxe_manager.public_ip_manager.iter_pages.call_args[1]['where']
+    assert where.where == {'owner': 'job-1', 'address': {'$in': ['10.0.0.1']}}
+    freed = pxe_manager.public_ip_manager.update_resources.call_args
+    assert freed[0] == ([{'address': '10.0.0.1'}], {'owner': '', 'lease_expires': None})
+
+
+def test_renew_reservation():
+    pxe_manager = _pxe_manager()
+    pxe_manager.private_ip_manager = mock.Mock(spec=IPPoolClient)
+    for manager, key in ((pxe_manager.host_manager, 'hostname'), (pxe_manager.public_ip_manager, 'address')):
+        manager.key = key
+        manager.iter_pages.return_value = iter([[{key: 'one'}, {key: 'two'}]])
+        manager.renew_leases.side_effect = lambda page, lease: {'succeeded': [page[0].values()[0]],
+                                                                'failed': [('two', 'precondition failed')]}
+    assert pxe_manager.renew_reservation('job-1', lease_seconds=3600) == 2
+    pxe_manager.host_manager.iter_pages.assert_called_once_with(where={'job_id': 'job-1'}, projection=['hostname'])
+    pxe_manager.public_ip_manager.iter_pages.assert_called_once_with(where={'owner': 'job-1'},
+                                                                     projection=['address'])
+    assert pxe_manager.host_manager.renew_leases.call_args[0][1] == 3600
+    assert not pxe_manager.private_ip_manager.method_calls
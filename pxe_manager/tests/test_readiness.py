@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+
+from pxe_manager.readiness import ReadinessWatcher
+
+
+def test_ready_once_port_is_open():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(5)
+    logins = []
+    watcher = ReadinessWatcher(login_check=lambda ip: logins.append(ip) or True,
+                               port=listener.getsockname()[1], timeout=5, initial_delay=0)
+    try:
+        assert watcher.wait({'host1': '127.0.0.1'}) == {'host1': True}
+    finally:
+        listener.close()
+    assert logins == ['127.0.0.1']
+
+
+def test_closed_port_times_out_without_login():
+    unused = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    unused.bind(('127.0.0.1', 0))
+    port = unused.getsockname()[1]
+    unused.close()
+    logins = []
+    watcher = ReadinessWatcher(login_check=lambda ip: logins.append(ip) or True,
+                               port=port, timeout=1, initial_delay=0, max_delay=0.2)
+    assert watcher.wait({'host1': '127.0.0.1'}) == {'host1': False}
+    assert logins == []
+
+
+def test_pushed_host_skips_probe():
+    watcher = ReadinessWatcher(login_check=lambda ip: True, port=1, timeout=5, initial_delay=60,
+                               push_source=lambda: ['host1'])
+    assert watcher.wait({'host1': '127.0.0.1'}) == {'host1': True}
+
+
+def test_pushed_host_login_backs_off():
+    logins = []
+    watcher = ReadinessWatcher(login_check=lambda ip: logins.append(ip) and False, port=1, timeout=1,
+                               initial_delay=60, max_delay=15, push_source=lambda: ['host1'], push_interval=0.01)
+    assert watcher.wait({'host1': '127.0.0.1'}) == {'host1': False}
+    assert logins == ['127.0.0.1']
+
+
+def test_blocked_login_does_not_hold_up_other_hosts():
+    release = threading.Event()
+
+    def login_check(ip):
+        if ip == '10.0.0.1':
+            release.wait(10)
+        return True
+    watcher = ReadinessWatcher(login_check=login_check, port=1, timeout=1, initial_delay=60,
+                               push_source=lambda: ['slow', 'fast'], push_interval=0.01)
+    started = time.time()
+    try:
+        assert watcher.wait({'slow': '10.0.0.1', 'fast': '10.0.0.2'}) == {'slow': False, 'fast': True}
+    finally:
+        release.set()
+    assert time.time() - started < 3
+
+
+def test_login_timeout_counts_as_failed():
+    release = threading.Event()
+    logins = []
+
+    def login_check(ip):
+        logins.append(ip)
+        release.wait(10)
+        return True
+    watcher = ReadinessWatcher(login_check=login_check, port=1, timeout=1, initial_delay=60, max_delay=15,
+                               push_source=lambda: ['host1'], push_interval=0.01, login_timeout=0.2)
+    try:
+        assert watcher.wait({'host1': '127.0.0.1'}) == {'host1': False}
+    finally:
+        release.set()
+    assert logins == ['127.0.0.1']
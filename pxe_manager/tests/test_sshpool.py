@@ -0,0 +1,88 @@
+import mock
+
+from pxe_manager.sshpool import SSHConnectionPool
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient')
+def test_connection_reused(ssh_client):
+    pool = SSHConnectionPool()
+    first = pool.get('10.0.0.1', 'root', 'foobar')
+    second = pool.get('10.0.0.1', 'root', 'foobar')
+    assert first is second
+    assert ssh_client.return_value.connect.call_count == 1
+    stats = pool.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['handshakes'] == 1
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient')
+def test_connect_timeouts(ssh_client):
+    pool = SSHConnectionPool(connect_timeout=1, banner_timeout=2, auth_timeout=3)
+    pool.get('10.0.0.1', 'root', 'foobar')
+    ssh_client.return_value.connect.assert_called_once_with('10.0.0.1', username='root', password='foobar',
+                                                            timeout=1, banner_timeout=2, auth_timeout=3)
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient')
+def test_inactive_connection_replaced(ssh_client):
+    pool = SSHConnectionPool()
+    pool.get('10.0.0.1', 'root', 'foobar')
+    ssh_client.return_value.get_transport.return_value.is_active.return_value = False
+    pool.get('10.0.0.1', 'root', 'foobar')
+    assert ssh_client.return_value.connect.call_count == 2
+    assert pool.stats()['misses'] == 2
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient', side_effect=lambda: mock.Mock())
+def test_least_recently_used_evicted(ssh_client):
+    pool = SSHConnectionPool(max_connections=2)
+    first = pool.get('10.0.0.1', 'root', 'foobar')
+    pool.get('10.0.0.2', 'root', 'foobar')
+    pool.get('10.0.0.3', 'root', 'foobar')
+    assert first.close.called
+    assert pool.stats()['open_connections'] == 2
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient')
+def test_idle_connection_expired(ssh_client):
+    pool = SSHConnectionPool(idle_timeout=-1)
+    pool.get('10.0.0.1', 'root', 'foobar')
+    pool.get('10.0.0.1', 'root', 'foobar')
+    assert pool.stats()['hits'] == 0
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient')
+def test_failed_connect_closed(ssh_client):
+    pool = SSHConnectionPool()
+    ssh_client.return_value.connect.side_effect = IOError('authentication failed')
+    try:
+        pool.get('10.0.0.1', 'root', 'foobar')
+    except IOError:
+        pass
+    else:
+        raise AssertionError('Connect error should be raised')
+    assert ssh_client.return_value.close.called
+    assert pool.stats()['open_connections'] == 0
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient', side_effect=lambda: mock.Mock())
+def test_checked_out_connection_not_evicted(ssh_client):
+    pool = SSHConnectionPool(max_connections=1, idle_timeout=-1)
+    with pool.checkout('10.0.0.1', 'root', 'foobar') as first:
+        second = pool.get('10.0.0.2', 'root', 'foobar')
+        assert not first.close.called
+        assert pool.stats()['open_connections'] == 2
+    assert not first.close.called
+    pool.get('10.0.0.3', 'root', 'foobar')
+    assert first.close.called
+    assert second.close.called
+
+
+@mock.patch('pxe_manager.sshpool.SSHClient', side_effect=lambda: mock.Mock())
+def test_discarded_while_checked_out_closed_on_release(ssh_client):
+    pool = SSHConnectionPool()
+    with pool.checkout('10.0.0.1', 'root', 'foobar') as client:
+        pool.discard('10.0.0.1', 'root')
+        assert not client.close.called
+    assert client.close.called
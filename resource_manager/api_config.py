@@ -1,7 +1,15 @@
 RESOURCE_METHODS = ['GET', 'POST', 'DELETE']
 ITEM_METHODS = ['GET', 'PATCH', 'PUT', 'DELETE']
-PAGINATION = False
+PAGINATION = True
+PAGINATION_LIMIT = 1000
+PAGINATION_DEFAULT = 500
 lookup_url = 'regex("[\.\w-]+")'
+# Claims without an explicit lease are reclaimed by the reaper after this many seconds, 0 disables expiry
+DEFAULT_LEASE_SECONDS = 7 * 24 * 3600
+REAPER_INTERVAL = 60
+# Largest address pool that can be created, a pool is one document so its bitmap and runs must stay well below Mongo's
+# 16MB limit. 2 ** 20 addresses (a /12) is a 128KB bitmap.
+MAX_IP_POOL_SIZE = 2 ** 20
 
 
 class ResourceSchema(object):
@@ -21,6 +29,16 @@ class ResourceSchema(object):
         },
         'job_id': {
             'type': 'string'
+        },
+        'kickstarted': {
+            'type': 'boolean'
+        },
+        'state_changed': {
+            'type': 'datetime'
+        },
+        'lease_expires': {
+            'type': 'datetime',
+            'nullable': True
         }
     }
 
@@ -32,16 +50,36 @@ class ResourceSchema(object):
         },
         'owner': {
             'type': 'string'
+        },
+        'lease_expires': {
+            'type': 'datetime',
+            'nullable': True
         }
     }
 
+    # The (state, owner) index also serves queries on state alone
+    machine_indexes = {
+        'hostname': ([('hostname', 1)], {'unique': True}),
+        'state_owner': [('state', 1), ('owner', 1)],
+        'owner': [('owner', 1)],
+        'job_id': [('job_id', 1)],
+        'lease_expires': ([('lease_expires', 1)], {'sparse': True})
+    }
+
+    address_indexes = {
+        'address': ([('address', 1)], {'unique': True}),
+        'owner': [('owner', 1)],
+        'lease_expires': ([('lease_expires', 1)], {'sparse': True})
+    }
+
     machines = {
         'item_title': 'machine',
         'additional_lookup': {
             'url': lookup_url,
             'field': 'hostname'
         },
-        'schema': machine_schema
+        'schema': machine_schema,
+        'mongo_indexes': machine_indexes
     }
 
     public_addresses = {
@@ -50,7 +88,8 @@ class ResourceSchema(object):
             'url': lookup_url,
             'field': 'address'
         },
-        'schema': address_schema
+        'schema': address_schema,
+        'mongo_indexes': address_indexes
     }
 
     private_addresses = {
@@ -59,7 +98,8 @@ class ResourceSchema(object):
             'url': lookup_url,
             'field': 'address'
         },
-        'schema': address_schema
+        'schema': address_schema,
+        'mongo_indexes': address_indexes
     }
 
 
@@ -0,0 +1,67 @@
+from multiprocessing.pool import ThreadPool
+
+from client import ResourceManagerClient
+
+
+class AsyncResourceManagerClient(object):
+    def __init__(self, resource_type='machines', endpoint='http://127.0.0.1:5000', username='admin', password='admin',
+                 max_concurrency=50, **client_options):
+        """
+        Non-blocking counterpart of ResourceManagerClient for fanning out many calls at once. Every method returns
+        immediately with a multiprocessing AsyncResult; its get() blocks for the value or re-raises the error.
+
+        Calls run on a pool of max_concurrency threads, so no more than that many requests are in flight. They share
+        the keep-alive session of one ResourceManagerClient whose connection pool is sized to match.
+
+        :param max_concurrency: (int) most requests in flight at once
+        :param client_options: further ResourceManagerClient options, e.g. timeout or retries
+        """
+        client_options.setdefault('pool_size', max_concurrency)
+        self.client = ResourceManagerClient(resource_type, endpoint, username, password, **client_options)
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPool(processes=max_concurrency)
+
+    def create_resource(self, resource, callback=None):
+        return self._submit(self.client.create_resource, (resource,), callback)
+
+    def get_resource(self, name, projection=None, callback=None):
+        return self._submit(self.client.get_resource, (name, projection), callback)
+
+    def update_resource(self, resource, callback=None):
+        return self._submit(self.client.update_resource, (resource,), callback)
+
+    def delete_resource(self, resource, callback=None):
+        return self._submit(self.client.delete_resource, (resource,), callback)
+
+    def find_resources(self, field, value, projection=None, callback=None):
+        return self._submit(self.client.find_resources, (field, value, projection), callback)
+
+    def get_all_resources(self, projection=None, callback=None):
+        return self._submit(self.client.get_all_resources, (projection,), callback)
+
+    def _submit(self, method, args, callback):
+        return self._pool.apply_async(method, args, callback=callback)
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """
+        Wait for several calls.
+
+        :param results: AsyncResults returned by this client
+        :param timeout: seconds to wait for each result
+        :return: list of the values, in the order of results
+        """
+        return [result.get(timeout) for result in results]
+
+    def close(self):
+        """
+        Let the calls already made finish and stop the worker threads.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class ResponseCache(object):
+    def __init__(self, max_entries=256, ttl=300):
+        """
+        Remembers the ETag and body of GET responses by URL, so the next request for the URL can be made conditional
+        and a 304 answered from memory. Entries are always revalidated with the server, max_entries and ttl only
+        bound how much is kept around.
+
+        :param max_entries: (int) most responses kept, the least recently used one is dropped to make room
+        :param ttl: (int) seconds after which a response is dropped
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        """
+        :return: (etag, body) stored for url, or None
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            now = time.time()
+            if now - entry[2] > self.ttl:
+                del self._entries[url]
+                return None
+            entry[3] = now
+            return entry[0], entry[1]
+
+    def put(self, url, etag, body):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            if url not in self._entries and len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda key: self._entries[key][3])
+                del self._entries[oldest]
+            self._entries[url] = [etag, body, now, now]
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidate(self, prefix=None):
+        """
+        Drop every response whose URL starts with prefix, or all of them.
+        """
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                return
+            for url in [url for url in self._entries if url.startswith(prefix)]:
+                del self._entries[url]
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,9 +1,19 @@
 #!/usr/bin/python
 import json
+import random
+import sys
+import threading
+import time
 import urllib
 import requests
 import argparse
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from multiprocessing.pool import ThreadPool
 from prettytable import PrettyTable
+from cache import ResponseCache
+from datetime import datetime, timedelta
+from query import DATE_FORMAT, Query
 
 
 class RequestFailureException(Exception):
@@ -16,39 +26,158 @@ class RequestFailureException(Exception):
         return "{0}:{1}".format(status_code, text)
 
 
+def make_session(pool_size, retries, backoff_factor):
+    """
+    :return: requests.Session keeping up to pool_size connections alive, retrying connection errors and 5xx
+             responses of idempotent requests
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _Prefetch(threading.Thread):
+    """
+    Calls function(*args) on a daemon thread. get() waits for the call and returns its result or re-raises its error.
+    """
+    def __init__(self, function, *args):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._call = (function, args)
+        self._result = None
+        self._error = None
+        self.start()
+
+    def run(self):
+        function, args = self._call
+        try:
+            self._result = function(*args)
+        except Exception:
+            self._error = sys.exc_info()
+
+    def get(self):
+        self.join()
+        if self._error:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+
 class ResourceManagerClient(object):
     FIELDS = {'machines': ["hostname", "owner", "state", "job_id", "_updated", "_id"],
               'private-addresses': ["address", "owner", "_updated", "_id"],
               'public-addresses': ["address",  "owner", "_updated", "_id"]}
 
-    def __init__(self, resource_type='machines', endpoint='http://127.0.0.1:5000', username='admin', password='admin'):
+    def __init__(self, resource_type='machines', endpoint='http://127.0.0.1:5000', username='admin', password='admin',
+                 pool_size=20, retries=3, backoff_factor=0.5, timeout=(3.05, 30), cache_size=256, cache_ttl=300):
+        """
+        All requests go through one requests.Session, so connections to the server are kept alive and reused. The
+        session is safe to share between the threads of the parallel PxeManager paths; pool_size should be at least
+        the number of threads issuing requests at once, or connections get thrown away after use.
+
+        :param resource_type: collection to manage, one of FIELDS
+        :param endpoint: base URL of the resource manager
+        :param username: API user
+        :param password: API password
+        :param pool_size: (int) connections kept open to the server
+        :param retries: (int) how often a request is retried on connection errors or 5xx responses. Only idempotent
+                        methods are retried on 5xx; POST and PATCH are never resent once the server has seen them.
+        :param backoff_factor: (float) retries sleep backoff_factor * 2 ** (attempt - 1) seconds
+        :param timeout: (float or (connect, read) tuple) seconds before giving up on the server, None waits forever
+        :param cache_size: (int) GET responses remembered for conditional requests, 0 disables the cache
+        :param cache_ttl: (int) seconds a remembered response is kept
+        """
         self.endpoint = endpoint + '/' + resource_type
         self.resource_type = resource_type
         self.key = self.FIELDS[self.resource_type][0]
         self.auth = (username, password)
         self.headers = {'content-type': 'application/json'}
         self.fields = self.FIELDS[self.resource_type]
+        self.timeout = timeout
+        self.session = make_session(pool_size, retries, backoff_factor)
+        self.cache = ResponseCache(max_entries=cache_size, ttl=cache_ttl)
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('auth', self.auth)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def _get(self, url, params=None):
+        """
+        GET through the response cache. A URL seen before is requested with If-None-Match and a 304 is answered
+        with the body remembered for it.
+
+        :return: (response, decoded body)
+        """
+        cache_key = url + '?' + urllib.urlencode(sorted((params or {}).items()))
+        cached = self.cache.get(cache_key)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self._request('GET', url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            self.cache.record(hit=True)
+            return response, json.loads(cached[1])
+        self.cache.record(hit=False)
+        if response.status_code == 200 and response.headers.get('ETag'):
+            self.cache.put(cache_key, response.headers['ETag'], response.text)
+        try:
+            return response, response.json()
+        except ValueError:
+            return response, None
+
+    def _forget(self, *names):
+        for name in names:
+            self.cache.invalidate(self.endpoint + '/' + urllib.quote_plus(name) + '?')
 
     def create_resource(self, resource):
-        resource = requests.post(self.endpoint, data=resource, headers=self.headers, auth=self.auth)
+        resource = self._request('POST', self.endpoint, data=resource, headers=self.headers)
         if resource.status_code != 201:
             raise RequestFailureException(resource)
 
-    def get_resource(self, name):
+    def get_resource(self, name, projection=None):
         url = self.endpoint + '/' + urllib.quote_plus(name)
-        return requests.get(url, auth=self.auth).json()
+        return self._get(url, params=self._projection_params(projection))[1]
 
     def update_resource(self, resource):
-        resource_name = json.loads(resource)[self.key]
-        server_response = self.get_resource(resource_name)
-        identifier = server_response['_id']
-        etag = server_response['_etag']
-        request_url = self.endpoint + "/" + identifier
-        headers = self.headers
-        headers['If-Match'] = etag
-        updated_resource = requests.patch(request_url, data=resource, headers=self.headers, auth=self.auth)
-        if updated_resource.status_code != 200:
-            raise RequestFailureException(updated_resource)
+        changes = json.loads(resource)
+        self.compare_and_swap(changes[self.key], lambda current: changes)
+
+    def compare_and_swap(self, name, mutate, retries=5, backoff=0.1, max_backoff=2):
+        """
+        Read a resource, derive changes from it and write them back only if nobody modified it in between. When the
+        write loses the race (412 Precondition Failed) the cycle starts over on a fresh copy.
+
+        :param name: key of the resource, e.g. the hostname
+        :param mutate: (callable) takes the current resource and returns a dict of the fields to change, or None to
+                       leave the resource as it is
+        :param retries: (int) how many lost races to retry before giving up
+        :param backoff: (float) seconds to wait before the first retry, doubled after every further lost race
+        :param max_backoff: (float) upper bound on the wait between retries
+        :return: the resource as it is after the call
+        """
+        url = self.endpoint + '/' + urllib.quote_plus(name)
+        for attempt in range(retries + 1):
+            response, current = self._get(url)
+            if response.status_code not in (200, 304):
+                raise RequestFailureException(response)
+            changes = mutate(current)
+            if changes is None:
+                return current
+            headers = dict(self.headers)
+            headers['If-Match'] = current['_etag']
+            updated = self._request('PATCH', self.endpoint + "/" + current['_id'], data=json.dumps(changes),
+                                    headers=headers)
+            self._forget(name, current['_id'])
+            if updated.status_code == 200:
+                current.update(changes)
+                current['_etag'] = updated.json().get('_etag', current['_etag'])
+                return current
+            if updated.status_code != 412 or attempt == retries:
+                raise RequestFailureException(updated)
+            # Jitter keeps contending writers from colliding again on the next round
+            time.sleep(min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1))
 
     def delete_resource(self, resource):
         resource_name = json.loads(resource)[self.key]
@@ -56,21 +185,259 @@ class ResourceManagerClient(object):
         identifier = server_response['_id']
         etag = server_response['_etag']
         request_url = self.endpoint + "/" + identifier
-        headers = self.headers
+        headers = dict(self.headers)
         headers['If-Match'] = etag
-        deleted_resource = requests.delete(request_url, data=resource, headers=self.headers, auth=self.auth)
+        deleted_resource = self._request('DELETE', request_url, data=resource, headers=headers)
+        self._forget(resource_name, identifier)
         if deleted_resource.status_code != 200:
             raise RequestFailureException(deleted_resource)
 
-    def find_resources(self, field, value):
-        query = self.endpoint + "?where=" + field + "==\"" + value + "\""
-        resource_request = requests.get(query, auth=self.auth)
-        if resource_request.status_code != 200:
-            raise RequestFailureException(resource_request)
-        return resource_request.json()
+    def update_resources(self, resources, data, max_workers=10):
+        """
+        Apply the same update to many resources concurrently. The _id and _etag already present in the resources
+        (e.g. from find_resources) are used directly, so no GET is needed before each PATCH.
+
+        :param resources: list of resource dicts, each holding at least the key field, _id and _etag
+        :param data: (dict or JSON string) fields to set on every resource
+        :param max_workers: how many requests to have in flight at once
+        :return: dict with 'succeeded', a list of resource keys, and 'failed', a list of (key, exception) tuples
+        """
+        if not isinstance(data, basestring):
+            data = json.dumps(data)
+        return self._bulk('PATCH', resources, data, max_workers)
+
+    def delete_resources(self, resources, max_workers=10):
+        """
+        Delete many resources concurrently, using the _id and _etag already present in the resources.
+
+        :param resources: list of resource dicts, each holding at least the key field, _id and _etag
+        :param max_workers: how many requests to have in flight at once
+        :return: dict with 'succeeded', a list of resource keys, and 'failed', a list of (key, exception) tuples
+        """
+        return self._bulk('DELETE', resources, None, max_workers)
+
+    def _bulk(self, method, resources, data, max_workers):
+        def send(resource):
+            headers = dict(self.headers)
+            headers['If-Match'] = resource['_etag']
+            try:
+                response = self._request(method, self.endpoint + "/" + resource['_id'], data=data, headers=headers)
+                self._forget(resource[self.key], resource['_id'])
+                if response.status_code not in (200, 204):
+                    raise RequestFailureException(response)
+            except Exception as e:
+                return e
+            return None
+
+        results = {'succeeded': [], 'failed': []}
+        if not resources:
+            return results
+        pool = ThreadPool(processes=max(1, min(max_workers, len(resources))))
+        try:
+            errors = pool.map(send, resources)
+        finally:
+            pool.close()
+            pool.join()
+        for resource, error in zip(resources, errors):
+            if error is None:
+                results['succeeded'].append(resource[self.key])
+            else:
+                results['failed'].append((resource[self.key], error))
+        return results
+
+    def renew_leases(self, resources, lease):
+        """
+        Push back the expiry of reserved resources, see update_resources.
+
+        :param resources: list of resource dicts holding the key field, _id and _etag
+        :param lease: seconds from now until the server reclaims the resources, 0 for never
+        :return: dict with 'succeeded' and 'failed' as returned by update_resources
+        """
+        return self.update_resources(resources, {'lease_expires': self.lease_expiry(lease)})
+
+    @staticmethod
+    def lease_expiry(lease):
+        """
+        :param lease: seconds from now, 0 for never
+        :return: lease_expires value in the server's date format, or None
+        """
+        if not lease:
+            return None
+        return (datetime.utcnow() + timedelta(seconds=lease)).strftime(DATE_FORMAT)
+
+    def count_by_state(self):
+        """
+        :return: (dict) machine state -> number of machines in it, answered by the server without a query
+        """
+        count_request = self._request('GET', self.endpoint + '/counts')
+        if count_request.status_code != 200:
+            raise RequestFailureException(count_request)
+        return count_request.json()
+
+    def claim_resources(self, count, owner, job_id, state='pxe', where=None, partial=False, lease=None):
+        """
+        Atomically reserve idle machines on the server in a single request.
+
+        :param count: how many machines to claim
+        :param owner: owner to set on the claimed machines
+        :param job_id: job_id to set on the claimed machines
+        :param state: state to move the claimed machines to
+        :param where: (dict) optional equality filter on machine fields
+        :param partial: accept fewer than count machines instead of failing with 409
+        :param lease: seconds until the server reclaims the machines, 0 for never, None for the server's default
+        :return: list of the claimed machines
+        """
+        body = {'count': count, 'owner': owner, 'job_id': job_id, 'state': state, 'where': where or {},
+                'partial': partial}
+        if lease is not None:
+            body['lease'] = lease
+        body = json.dumps(body)
+        claim_request = self._request('POST', self.endpoint + '/claim', data=body, headers=self.headers)
+        if claim_request.status_code != 200:
+            raise RequestFailureException(claim_request)
+        return claim_request.json()['_items']
+
+    def find_resources(self, field, value, projection=None):
+        return {'_items': list(self.iter_resources(where={field: value}, projection=projection))}
+
+    def get_all_resources(self, projection=None):
+        return list(self.iter_resources(projection=projection))
+
+    def iter_resources(self, where=None, page_size=500, projection=None):
+        """
+        Generator over the resources matching where, fetched lazily one page at a time.
+
+        :param where: (dict) equality filter, e.g. {'owner': 'tony'}, or a Query
+        :param page_size: resources per request, the server caps this at its PAGINATION_LIMIT
+        :param projection: optional list of the fields to fetch, see _projection_params
+        """
+        for page in self.iter_pages(where=where, page_size=page_size, projection=projection):
+            for resource in page:
+                yield resource
+
+    def iter_pages(self, where=None, page_size=500, projection=None):
+        """
+        Generator over pages (lists) of the resources matching where. The next page is requested in the background
+        while the caller works through the current one. Unless the query is sorted, pages follow on from the last
+        _id seen rather than a page number, so the caller may modify resources as they arrive without shifting the
+        pages still to come.
+
+        :param where: (dict) equality filter, e.g. {'owner': 'tony'}, or a Query
+        :param page_size: resources per request, the server caps this at its PAGINATION_LIMIT
+        :param projection: optional list of the fields to fetch, see _projection_params
+        """
+        query = where if isinstance(where, Query) else Query(**(where or {}))
+        remaining = query.max_results
+        if remaining is not None:
+            page_size = max(1, min(page_size, remaining))
+        page_number = 1
+        # A plain thread per page, a ThreadPool costs three threads to set up and tear down on every call
+        pending = _Prefetch(self._get_page, query, None, page_number, page_size, projection)
+        try:
+            while pending:
+                items, more = pending.get()
+                pending = None
+                if remaining is not None:
+                    items = items[:remaining]
+                    remaining -= len(items)
+                    more = more and remaining > 0
+                if more and items:
+                    page_number += 1
+                    after = None if query.sort_fields else items[-1]['_id']
+                    pending = _Prefetch(self._get_page, query, after, page_number, page_size, projection)
+                if items:
+                    yield items
+        finally:
+            if pending:
+                pending.join()
+
+    def _projection_params(self, projection):
+        """
+        Only the requested fields and the resource key are sent back, plus the _id, _etag and _updated the server
+        always includes, so the result can still be passed to update_resources.
+
+        :param projection: list of field names, or None for whole documents
+        :return: (dict) query parameters
+        """
+        if not projection:
+            return {}
+        fields = dict((field, 1) for field in projection)
+        fields[self.key] = 1
+        return {'projection': json.dumps(fields)}
+
+    def _get_page(self, query, after, page_number, page_size, projection):
+        params = {'where': query.compile(after), 'sort': query.compile_sort(), 'max_results': page_size}
+        if query.sort_fields and page_number > 1:
+            params['page'] = page_number
+        params.update(self._projection_params(projection))
+        page_request, page = self._get(self.endpoint, params=params)
+        if page_request.status_code not in (200, 304):
+            raise RequestFailureException(page_request)
+        return page.get('_items', []), 'next' in page.get('_links', {})
+
+
+class IPPoolClient(object):
+    def __init__(self, pool, endpoint='http://127.0.0.1:5000', username='admin', password='admin', pool_size=20,
+                 retries=3, backoff_factor=0.5, timeout=(3.05, 30)):
+        """
+        Client for one range-backed address pool. Reserving or freeing any number of addresses is a single request,
+        however large the pool. Pools are not Eve resources, so this only speaks the /ip-pools routes.
+
+        :param pool: name of the pool
+        :param pool_size, retries, backoff_factor, timeout: as for ResourceManagerClient
+        """
+        self.pool = pool
+        self.endpoint = endpoint + '/ip-pools'
+        self.pool_url = self.endpoint + '/' + urllib.quote_plus(pool)
+        self.auth = (username, password)
+        self.headers = {'content-type': 'application/json'}
+        self.timeout = timeout
+        self.session = make_session(pool_size, retries, backoff_factor)
+
+    def create_pool(self, cidr=None, first=None, last=None):
+        """
+        Create the pool from a CIDR block (network and broadcast addresses left out) or a first-last range.
+        """
+        body = {'name': self.pool, 'cidr': cidr, 'first': first, 'last': last}
+        return self._pool_request(self.endpoint, body, 201)
+
+    def status(self):
+        """
+        :return: (dict) range, size, free count and addresses held per owner
+        """
+        response = self._request('GET', self.pool_url)
+        if response.status_code != 200:
+            raise RequestFailureException(response)
+        return response.json()
+
+    def allocate(self, count, owner):
+        """
+        :return: list of the addresses handed to owner
+        :raises RequestFailureException: with status 409 if fewer than count addresses are free
+        """
+        return self._pool_request(self.pool_url + '/allocate', {'count': count, 'owner': owner})['addresses']
+
+    def free(self, owner=None, addresses=None):
+        """
+        Free everything owner holds, or the given addresses.
+
+        :return: list of the freed ranges as [first address, last address]
+        """
+        if not (owner or addresses):
+            raise ValueError('Give an owner or the addresses to free')
+        body = {'owner': owner} if owner else {'addresses': addresses}
+        return self._pool_request(self.pool_url + '/free', body)['ranges']
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('auth', self.auth)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
 
-    def get_all_resources(self):
-        return requests.get(self.endpoint, auth=self.auth).json()["_items"]
+    def _pool_request(self, url, body, expected_status=200):
+        response = self._request('POST', url, data=json.dumps(body), headers=self.headers)
+        if response.status_code != expected_status:
+            raise RequestFailureException(response)
+        return response.json()
 
 if __name__ == "__main__":
     resources = ['machines', 'public-addresses', 'private-addresses']
@@ -86,9 +453,8 @@ if __name__ == "__main__":
     if args.operation == 'create':
         client.create_resource(args.json)
     elif args.operation == 'list':
-        items = client.get_all_resources()
         table = PrettyTable(client.fields)
-        for resource in items:
+        for resource in client.iter_resources(projection=client.fields):
             table.add_row([resource.get(field, None) for field in client.fields])
         print(table.get_string(fields=client.fields))
     elif args.operation == 'update':
@@ -0,0 +1,312 @@
+import socket
+import struct
+
+from bson.binary import Binary
+
+from operations import meta_updates
+
+
+def ip_to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def parse_cidr(cidr):
+    """
+    :return: (first, last) usable addresses of a CIDR block as ints, network and broadcast addresses are left out
+             of blocks larger than /31
+    """
+    network, prefix = cidr.split('/')
+    prefix = int(prefix)
+    if not 0 <= prefix <= 32:
+        raise ValueError('Invalid prefix length in ' + cidr)
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    first = ip_to_int(network) & mask
+    last = first | (~mask & 0xFFFFFFFF)
+    if prefix < 31:
+        first, last = first + 1, last - 1
+    return first, last
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class PoolTooLarge(ValueError):
+    pass
+
+
+class IPPool(object):
+    def __init__(self, name, first, size, bitmap=None, owners=None, free=None, hint=0):
+        """
+        A range of addresses kept as one document: bit i of the bitmap is set while address first + i is handed out,
+        and every owner's addresses are remembered as (offset, length) runs so they can be freed together. A /16 is
+        an 8KB bitmap instead of 65k documents.
+
+        :param name: name of the pool
+        :param first: (int) first address of the range
+        :param size: (int) number of addresses in the range
+        :param bitmap: (bytearray) allocation bitmap, all free if not given
+        :param owners: (dict) owner -> list of [offset, length] runs
+        :param free: (int) number of free addresses, counted from the bitmap if not given
+        :param hint: (int) offset where the search for free addresses starts
+        """
+        self.name = name
+        self.first = first
+        self.size = size
+        if bitmap is None:
+            bitmap = bytearray((size + 7) // 8)
+            # Bits past the end of the range count as taken so that whole bytes can be skipped when full
+            for offset in range(size, len(bitmap) * 8):
+                bitmap[offset >> 3] |= 1 << (offset & 7)
+        self.bitmap = bitmap
+        self.owners = owners or {}
+        self.free = free if free is not None else size - sum(length for runs in self.owners.values()
+                                                             for _, length in runs)
+        self.hint = hint
+
+    @classmethod
+    def from_cidr(cls, name, cidr, max_size=None):
+        """
+        :param max_size: (int) optional, most addresses the pool may hold
+        :raises PoolTooLarge: if the block holds more than max_size addresses, checked before the bitmap is built
+        """
+        first, last = parse_cidr(cidr)
+        return cls(name, first, _checked_size(first, last, max_size))
+
+    @classmethod
+    def from_range(cls, name, first, last, max_size=None):
+        """
+        :param max_size: (int) optional, most addresses the pool may hold
+        :raises PoolTooLarge: if the range holds more than max_size addresses, checked before the bitmap is built
+        """
+        first, last = ip_to_int(first), ip_to_int(last)
+        if last < first:
+            raise ValueError('Range ends before it starts')
+        return cls(name, first, _checked_size(first, last, max_size))
+
+    def allocate(self, count, owner):
+        """
+        Hand out count free addresses to owner.
+
+        :return: list of the addresses
+        :raises PoolExhausted: if fewer than count addresses are free, nothing is allocated then
+        """
+        if count > self.free:
+            message = 'Only {0} of {1} requested addresses are free in {2}'
+            raise PoolExhausted(message.format(self.free, count, self.name))
+        offsets = self._find_free(count)
+        for offset in offsets:
+            self.bitmap[offset >> 3] |= 1 << (offset & 7)
+        self.free -= len(offsets)
+        if offsets:
+            self.hint = (offsets[-1] + 1) % self.size
+        self.owners[owner] = _merge_runs(self.owners.get(owner, []), _runs(offsets))
+        return [int_to_ip(self.first + offset) for offset in offsets]
+
+    def free_owner(self, owner):
+        """
+        Return all addresses of owner to the pool.
+
+        :return: list of the freed ranges as [first address, last address]
+        """
+        return self._release(self.owners.pop(owner, []))
+
+    def free_addresses(self, addresses):
+        """
+        Return single addresses to the pool, whoever holds them.
+
+        :return: list of the ranges that were allocated and are now free, as [first address, last address]
+        :raises ValueError: if an address is malformed or outside the pool, nothing is freed then
+        """
+        cuts = _runs(set(self.offset(address) for address in addresses))
+        released = []
+        for owner in list(self.owners):
+            kept, removed = _subtract_runs(self.owners[owner], cuts)
+            if not removed:
+                continue
+            if kept:
+                self.owners[owner] = kept
+            else:
+                del self.owners[owner]
+            released.extend(removed)
+        return self._release(_merge_runs(released, []))
+
+    def offset(self, address):
+        """
+        :return: position of address in the pool
+        :raises ValueError: if the address is malformed or outside the pool
+        """
+        try:
+            offset = ip_to_int(address) - self.first
+        except (socket.error, TypeError):
+            raise ValueError('Invalid address: "{0}"'.format(address))
+        if not 0 <= offset < self.size:
+            raise ValueError('{0} is not in pool {1}'.format(address, self.name))
+        return offset
+
+    def _release(self, runs):
+        for start, length in runs:
+            self._clear(start, length)
+            self.free += length
+        return [[int_to_ip(self.first + start), int_to_ip(self.first + start + length - 1)] for start, length in runs]
+
+    def _clear(self, start, length):
+        # Single bits at the edges, whole bytes in between
+        bitmap = self.bitmap
+        offset = start
+        end = start + length
+        while offset < end and offset & 7:
+            bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+            offset += 1
+        full = (end - offset) >> 3
+        if full:
+            bitmap[offset >> 3:(offset >> 3) + full] = bytearray(full)
+            offset += full * 8
+        while offset < end:
+            bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+            offset += 1
+
+    def _find_free(self, count):
+        found = []
+        offset = self.hint
+        scanned = 0
+        bitmap = self.bitmap
+        while len(found) < count and scanned < self.size:
+            if offset >= self.size:
+                offset = 0
+            if offset & 7 == 0 and bitmap[offset >> 3] == 0xFF:
+                offset += 8
+                scanned += 8
+                continue
+            if not bitmap[offset >> 3] & (1 << (offset & 7)):
+                found.append(offset)
+            offset += 1
+            scanned += 1
+        return sorted(found)
+
+    def summary(self):
+        return {'name': self.name,
+                'first': int_to_ip(self.first),
+                'last': int_to_ip(self.first + self.size - 1),
+                'size': self.size,
+                'free': self.free,
+                'owners': dict((owner, sum(length for _, length in runs)) for owner, runs in self.owners.items())}
+
+    def to_document(self):
+        # Owner names may hold characters Mongo does not allow in keys, so owners are stored as a list
+        return {'name': self.name,
+                'first': self.first,
+                'size': self.size,
+                'bitmap': Binary(bytes(self.bitmap)),
+                'owners': [{'owner': owner, 'runs': runs} for owner, runs in self.owners.items()],
+                'free': self.free,
+                'hint': self.hint}
+
+    @classmethod
+    def from_document(cls, document):
+        owners = dict((entry['owner'], [list(run) for run in entry['runs']]) for entry in document['owners'])
+        return cls(document['name'], document['first'], document['size'], bytearray(document['bitmap']), owners,
+                   document['free'], document['hint'])
+
+
+def _checked_size(first, last, max_size):
+    size = last - first + 1
+    if max_size is not None and size > max_size:
+        raise PoolTooLarge('A pool of {0} addresses is larger than the limit of {1}'.format(size, max_size))
+    return size
+
+
+def _runs(offsets):
+    runs = []
+    for offset in sorted(offsets):
+        if runs and runs[-1][0] + runs[-1][1] == offset:
+            runs[-1][1] += 1
+        else:
+            runs.append([offset, 1])
+    return runs
+
+
+def _merge_runs(runs, other):
+    """
+    :return: the union of two lists of non-overlapping [offset, length] runs, sorted with adjacent runs joined
+    """
+    merged = []
+    for start, length in sorted(runs + other):
+        if merged and merged[-1][0] + merged[-1][1] == start:
+            merged[-1][1] += length
+        else:
+            merged.append([start, length])
+    return merged
+
+
+def _subtract_runs(runs, cuts):
+    """
+    Remove the ranges in cuts from runs, both sorted lists of non-overlapping [offset, length] runs.
+
+    :return: (runs left over, runs removed)
+    """
+    kept = []
+    removed = []
+    first_cut = 0
+    for start, length in runs:
+        end = start + length
+        while first_cut < len(cuts) and cuts[first_cut][0] + cuts[first_cut][1] <= start:
+            first_cut += 1
+        position = start
+        cut = first_cut
+        while cut < len(cuts) and cuts[cut][0] < end:
+            cut_start = max(cuts[cut][0], start)
+            cut_end = min(cuts[cut][0] + cuts[cut][1], end)
+            if cut_start > position:
+                kept.append([position, cut_start - position])
+            removed.append([cut_start, cut_end - cut_start])
+            position = cut_end
+            cut += 1
+        if position < end:
+            kept.append([position, end - position])
+    return kept, removed
+
+
+def create_pool(db, pool, collection='ip_pools'):
+    """
+    :return: False if a pool with the same name exists
+    """
+    if db[collection].find_one({'name': pool.name}, {'_id': 1}):
+        return False
+    document = pool.to_document()
+    document.update(meta_updates())
+    document['_created'] = document['_updated']
+    document['version'] = 0
+    db[collection].insert_one(document)
+    return True
+
+
+def update_pool(db, name, change, collection='ip_pools', retries=10):
+    """
+    Read a pool, apply change to it and write it back unless another request changed it meanwhile, in which case
+    the cycle is retried.
+
+    :param change: (callable) takes the IPPool, modifies it and returns the result to pass on
+    :return: (pool, result of change), pool is None if there is no such pool
+    """
+    for _ in range(retries + 1):
+        document = db[collection].find_one({'name': name})
+        if document is None:
+            return None, None
+        pool = IPPool.from_document(document)
+        result = change(pool)
+        updates = pool.to_document()
+        updates.update(meta_updates())
+        written = db[collection].update_one({'_id': document['_id'], 'version': document['version']},
+                                            {'$set': updates, '$inc': {'version': 1}})
+        if written.matched_count:
+            return pool, result
+    raise PoolBusy('Pool {0} kept changing, giving up'.format(name))
@@ -0,0 +1,113 @@
+import uuid
+from datetime import datetime
+
+from transitions import LEASED_STATES
+
+
+def meta_updates():
+    """
+    Eve metadata for documents modified directly in Mongo. A new _etag keeps If-Match and If-None-Match checks
+    honest for clients holding the previous version.
+    """
+    return {'_updated': datetime.utcnow().replace(microsecond=0), '_etag': uuid.uuid4().hex}
+
+
+def mark_kickstarted(db, hostname):
+    """
+    Record that a machine finished its kickstart.
+
+    :param db: Mongo database holding the resource collections
+    :param hostname: machine that reported in
+    :return: True if the machine exists
+    """
+    updates = {'kickstarted': True}
+    updates.update(meta_updates())
+    result = db['machines'].update_one({'hostname': hostname}, {'$set': updates})
+    return result.matched_count == 1
+
+
+def ensure_indexes(db, indexes):
+    """
+    Create declared indexes that are missing from their collection, and rebuild those whose keys changed. Eve
+    builds mongo_indexes when it registers a resource, this also catches indexes lost since, e.g. by restoring a dump.
+
+    :param db: Mongo database holding the resource collections
+    :param indexes: (dict) collection name -> index declarations in the mongo_indexes format of api_config
+    :return: list of (collection, index name) that were created
+    """
+    created = []
+    for collection, declared in indexes.items():
+        existing = db[collection].index_information()
+        for name, value in declared.items():
+            if isinstance(value, tuple):
+                keys, options = value
+            else:
+                keys, options = value, {}
+            if name in existing:
+                if [(key, int(direction)) for key, direction in existing[name]['key']] == keys:
+                    continue
+                db[collection].drop_index(name)
+            db[collection].create_index(keys, name=name, **options)
+            created.append((collection, name))
+    return created
+
+
+class ClaimError(Exception):
+    pass
+
+
+def claim_resources(db, collection, count, updates, where=None, available=None, partial=False):
+    """
+    Atomically hand out up to count documents. Each document is picked and modified in a single find-and-modify,
+    so two concurrent claims can never get the same document.
+
+    :param db: Mongo database holding the resource collections
+    :param collection: name of the collection to claim from
+    :param count: how many documents to claim
+    :param updates: (dict) fields to set on every claimed document
+    :param where: (dict) optional extra equality filter, e.g. {'hostname': 'node-1'}
+    :param available: (dict) filter matching documents that are free to claim
+    :param partial: return whatever could be claimed instead of failing when fewer than count are available
+    :return: list of the claimed documents as they are after the claim
+    """
+    query = dict(where or {})
+    query.update(available or {})
+    claimed = []
+    for _ in range(count):
+        changes = dict(updates)
+        changes.update(meta_updates())
+        original = db[collection].find_one_and_update(query, {'$set': changes})
+        if original is None:
+            break
+        claimed.append((original, changes))
+    if len(claimed) < count and not partial:
+        for original, changes in claimed:
+            restore = {'$set': dict((key, original[key]) for key in changes if key in original)}
+            unset = dict((key, '') for key in changes if key not in original)
+            if unset:
+                restore['$unset'] = unset
+            db[collection].update_one({'_id': original['_id'], '_etag': changes['_etag']}, restore)
+        raise ClaimError('Only {0} of {1} requested {2} are available'.format(len(claimed), count, collection))
+    return [dict(original, **changes) for original, changes in claimed]
+
+
+def reap_expired(db, collection, reset, now=None):
+    """
+    Hand back every document whose lease has run out, with one update over the lease_expires index.
+
+    :param db: Mongo database holding the resource collections
+    :param collection: name of the collection to reap
+    :param reset: (dict) fields to set on expired documents, e.g. {'owner': ''}. If it sets a state, only documents
+                  in one of the LEASED_STATES are reaped.
+    :param now: (datetime) leases that expired at or before this time are reaped, defaults to the current time
+    :return: number of documents reclaimed
+    """
+    now = now or datetime.utcnow()
+    query = {'lease_expires': {'$lte': now}}
+    updates = dict(reset)
+    updates.update(meta_updates())
+    if 'state' in reset:
+        query['state'] = {'$in': LEASED_STATES}
+        updates['state_changed'] = updates['_updated']
+    result = db[collection].update_many(query, {'$set': updates, '$unset': {'lease_expires': ''}})
+    return result.modified_count
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime
+
+# Eve's DATE_FORMAT, values in this format are turned back into dates by the server
+DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+
+class Query(object):
+    def __init__(self, **equals):
+        """
+        Builds the Mongo style where, sort and max_results arguments of an Eve collection query, e.g. all pxe_failed
+        machines that have not been updated for an hour:
+
+            Query(state='pxe_failed').updated_before(datetime.utcnow() - timedelta(hours=1)).sort('_updated')
+
+        Every method returns the query so calls can be chained. Conditions on the same field are combined.
+
+        :param equals: fields that have to be equal to the given values
+        """
+        self.where = {}
+        self.sort_fields = []
+        self.max_results = None
+        for field, value in equals.items():
+            self.equals(field, value)
+
+    def equals(self, field, value):
+        self.where[field] = self._value(value)
+        return self
+
+    def not_equal(self, field, value):
+        return self._condition(field, '$ne', value)
+
+    def is_in(self, field, values):
+        return self._condition(field, '$in', [self._value(value) for value in values])
+
+    def not_in(self, field, values):
+        return self._condition(field, '$nin', [self._value(value) for value in values])
+
+    def range(self, field, gt=None, gte=None, lt=None, lte=None):
+        """
+        Bound a field, unset bounds are left open.
+        """
+        for operator, value in (('$gt', gt), ('$gte', gte), ('$lt', lt), ('$lte', lte)):
+            if value is not None:
+                self._condition(field, operator, value)
+        return self
+
+    def updated_before(self, when):
+        return self.range('_updated', lt=when)
+
+    def updated_since(self, when):
+        return self.range('_updated', gte=when)
+
+    def sort(self, field, descending=False):
+        """
+        Order results by field, call again to break ties on further fields.
+        """
+        self.sort_fields.append((field, -1 if descending else 1))
+        return self
+
+    def limit(self, max_results):
+        """
+        Stop after max_results resources.
+        """
+        self.max_results = max_results
+        return self
+
+    def compile(self, after=None):
+        """
+        :param after: optional _id, only resources with a greater _id are matched
+        :return: (string) the JSON where argument
+        """
+        where = dict(self.where)
+        if after:
+            where['_id'] = {'$gt': after}
+        return json.dumps(where)
+
+    def compile_sort(self):
+        """
+        :return: (string) the sort argument, _id always breaks ties so that paging is stable
+        """
+        fields = list(self.sort_fields)
+        if '_id' not in [field for field, _ in fields]:
+            fields.append(('_id', 1))
+        return ','.join(('-' if direction < 0 else '') + field for field, direction in fields)
+
+    def _condition(self, field, operator, value):
+        current = self.where.get(field)
+        if not isinstance(current, dict):
+            current = {} if current is None else {'$eq': current}
+            self.where[field] = current
+        current[operator] = self._value(value)
+        return self
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, datetime):
+            return value.strftime(DATE_FORMAT)
+        return value
+
+    def __repr__(self):
+        return 'Query(where={0}, sort={1!r}, limit={2})'.format(self.compile(), self.compile_sort(), self.max_results)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from operations import reap_expired
+
+
+class LeaseReaper(object):
+    def __init__(self, db, collections, interval=60, on_reap=None):
+        """
+        Background thread that reclaims machines and addresses whose lease expired, so reservations leaked by
+        crashed jobs return to the pool without anyone freeing them by hand.
+
+        :param db: Mongo database holding the resource collections
+        :param collections: (dict) collection name -> fields to set on its expired documents
+        :param interval: (int) seconds between cycles
+        :param on_reap: (callable) optional, called with the collection name and count after documents were reclaimed
+        """
+        self.db = db
+        self.collections = collections
+        self.interval = interval
+        self.on_reap = on_reap
+        self.cycles = 0
+        self.errors = 0
+        self.reclaimed = dict((collection, 0) for collection in collections)
+        self.last_run = None
+        self.last_duration = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        """
+        Reap every collection once.
+
+        :return: (dict) collection name -> documents reclaimed in this cycle
+        """
+        started = time.time()
+        reclaimed = {}
+        for collection, reset in self.collections.items():
+            try:
+                reclaimed[collection] = reap_expired(self.db, collection, reset, now)
+            except Exception as e:
+                print "Could not reap expired leases in " + collection + ": " + str(e)
+                with self._lock:
+                    self.errors += 1
+                continue
+            if reclaimed[collection] and self.on_reap:
+                # The reaper thread must survive a failing callback, or leases stop being reclaimed unnoticed
+                try:
+                    self.on_reap(collection, reclaimed[collection])
+                except Exception as e:
+                    print "Reap callback failed for " + collection + ": " + str(e)
+                    with self._lock:
+                        self.errors += 1
+        with self._lock:
+            self.cycles += 1
+            self.last_run = started
+            self.last_duration = time.time() - started
+            for collection, count in reclaimed.items():
+                self.reclaimed[collection] += count
+        return reclaimed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='lease-reaper')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            self._stop.wait(self.interval)
+            if self._stop.is_set():
+                return
+            self.run_once()
+
+    def metrics(self):
+        """
+        :return: (dict) reclaimed counts per collection and timing of the last cycle
+        """
+        with self._lock:
+            return {'cycles': self.cycles,
+                    'errors': self.errors,
+                    'reclaimed': dict(self.reclaimed),
+                    'last_run': self.last_run,
+                    'last_duration': self.last_duration}
@@ -1,8 +1,15 @@
 #!/usr/bin/python
+import json
+from datetime import datetime, timedelta
 from eve import Eve
-from eve.auth import BasicAuth
+from eve.auth import BasicAuth, requires_auth
+from flask import Response, abort, jsonify, request
 from flask_bootstrap import Bootstrap
 from eve_docs import eve_docs
+from ip_pool import IPPool, PoolBusy, PoolExhausted, PoolTooLarge, create_pool, update_pool
+from operations import ClaimError, claim_resources, ensure_indexes, mark_kickstarted
+from reaper import LeaseReaper
+from transitions import StateCounter, TransitionError, check_transition, stamp_transition
 
 
 class ResourceManagerBasicAuth(BasicAuth):
@@ -17,4 +24,234 @@ class ResourceManagerBasicAuth(BasicAuth):
 app = Eve(settings="./api_config.py", auth=ResourceManagerBasicAuth)
 Bootstrap(app)
 app.register_blueprint(eve_docs, url_prefix='/docs')
+
+with app.app_context():
+    db = app.data.driver.db
+indexes = dict((app.config['SOURCES'][resource]['source'], settings['mongo_indexes'])
+               for resource, settings in app.config['DOMAIN'].items() if settings.get('mongo_indexes'))
+indexes['ip_pools'] = {'name': ([('name', 1)], {'unique': True})}
+for collection, index in ensure_indexes(db, indexes):
+    print "Created missing index {0} on {1}".format(index, collection)
+state_counter = StateCounter()
+state_counter.load(db)
+
+
+def validate_transition(updates, original):
+    try:
+        stamp_transition(updates, original)
+    except TransitionError as e:
+        abort(422, description=str(e))
+
+
+def count_update(updates, original):
+    state_counter.move(original.get('state'), updates.get('state', original.get('state')))
+
+
+def count_inserts(items):
+    for item in items:
+        state_counter.add(item.get('state'))
+
+
+def count_delete(item):
+    state_counter.remove(item.get('state'))
+
+
+def recount():
+    state_counter.load(db)
+
+
+def reaped(collection, count):
+    print "Reclaimed {0} expired lease(s) in {1}".format(count, collection)
+    if collection == 'machines':
+        recount()
+
+app.on_update_machines += validate_transition
+app.on_replace_machines += validate_transition
+app.on_updated_machines += count_update
+app.on_replaced_machines += count_update
+app.on_inserted_machines += count_inserts
+app.on_deleted_item_machines += count_delete
+app.on_deleted_resource_machines += recount
+
+address_reset = {'owner': ''}
+reaper = LeaseReaper(db, {'machines': {'state': 'idle', 'owner': '', 'job_id': '', 'kickstarted': False},
+                          app.config['SOURCES']['public-addresses']['source']: address_reset,
+                          app.config['SOURCES']['private-addresses']['source']: address_reset},
+                     interval=app.config['REAPER_INTERVAL'], on_reap=reaped)
+
+
+@app.after_request
+def conditional_collections(response):
+    # Eve only sets ETags on items. Tagging the other GET responses by content lets pollers revalidate collections
+    # with If-None-Match and get an empty 304 while nothing changed.
+    if request.method == 'GET' and response.status_code == 200 and 'ETag' not in response.headers:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+@app.route('/machines/<hostname>/kickstarted', methods=['POST'])
+@requires_auth('home')
+def kickstarted(hostname):
+    # Hit from the kickstart %post so PxeManager can hand the machine over without waiting for its next probe
+    if not mark_kickstarted(app.data.driver.db, hostname):
+        abort(404)
+    return jsonify({'hostname': hostname, 'kickstarted': True})
+
+
+@app.route('/machines/claim', methods=['POST'])
+@requires_auth('home')
+def claim_machines():
+    """
+    Reserve "count" idle machines in one request. Body: {"count": 3, "owner": "tony", "job_id": "job-1",
+    "state": "pxe", "where": {"field": "value"}, "partial": false}
+    """
+    body = request.get_json(force=True) or {}
+    schema = app.config['DOMAIN']['machines']['schema']
+    where = body.get('where') or {}
+    state = body.get('state', 'pxe')
+    try:
+        count = int(body['count'])
+    except (KeyError, TypeError, ValueError):
+        abort(400, description='"count" must be an integer')
+    if state not in schema['state']['allowed']:
+        abort(400, description='Unknown state: "{0}"'.format(state))
+    try:
+        check_transition('idle', state)
+    except TransitionError as e:
+        abort(400, description=str(e))
+    for field, value in where.items():
+        if field not in schema or isinstance(value, (dict, list)):
+            abort(400, description='"where" only supports equality on machine fields')
+    try:
+        lease = int(body.get('lease', app.config['DEFAULT_LEASE_SECONDS']))
+    except (TypeError, ValueError):
+        abort(400, description='"lease" must be a number of seconds')
+    now = datetime.utcnow().replace(microsecond=0)
+    updates = {'owner': body.get('owner', ''), 'job_id': body.get('job_id', ''), 'state': state,
+               'kickstarted': False, 'state_changed': now,
+               'lease_expires': now + timedelta(seconds=lease) if lease > 0 else None}
+    try:
+        claimed = claim_resources(app.data.driver.db, 'machines', count, updates, where=where,
+                                  available={'state': 'idle'}, partial=bool(body.get('partial')))
+    except ClaimError as e:
+        abort(409, description=str(e))
+    state_counter.move('idle', state, len(claimed))
+    return Response(json.dumps({'_items': claimed}, cls=app.data.json_encoder_class), mimetype='application/json')
+
+
+@app.route('/machines/counts', methods=['GET'])
+@requires_auth('home')
+def machine_counts():
+    # Served from memory, no query is made
+    states = app.config['DOMAIN']['machines']['schema']['state']['allowed']
+    return jsonify(dict((state, state_counter.count(state)) for state in states))
+
+
+@app.route('/reaper', methods=['GET'])
+@requires_auth('home')
+def reaper_metrics():
+    return jsonify(reaper.metrics())
+
+
+@app.errorhandler(PoolBusy)
+def pool_busy(error):
+    # The pool is under heavy concurrent change, the request is safe to resend
+    response = jsonify({'_status': 'ERR', '_error': {'code': 503, 'message': str(error)}})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+@app.route('/ip-pools', methods=['GET'])
+@requires_auth('home')
+def list_ip_pools():
+    pools = [IPPool.from_document(document).summary() for document in db['ip_pools'].find()]
+    return jsonify({'_items': pools})
+
+
+@app.route('/ip-pools', methods=['POST'])
+@requires_auth('home')
+def create_ip_pool():
+    """
+    Body: {"name": "public", "cidr": "10.111.0.0/16"} or {"name": "public", "first": "10.111.5.1",
+    "last": "10.111.5.254"}
+    """
+    body = request.get_json(force=True) or {}
+    max_size = app.config['MAX_IP_POOL_SIZE']
+    try:
+        if body.get('cidr'):
+            pool = IPPool.from_cidr(body['name'], body['cidr'], max_size=max_size)
+        else:
+            pool = IPPool.from_range(body['name'], body['first'], body['last'], max_size=max_size)
+    except PoolTooLarge as e:
+        abort(400, description=str(e))
+    except (KeyError, ValueError, TypeError, AttributeError, IndexError):
+        abort(400, description='A pool needs a "name" and either a "cidr" or a "first" and "last" address')
+    if not create_pool(db, pool):
+        abort(409, description='Pool {0} exists'.format(pool.name))
+    return jsonify(pool.summary()), 201
+
+
+@app.route('/ip-pools/<name>', methods=['GET'])
+@requires_auth('home')
+def get_ip_pool(name):
+    document = db['ip_pools'].find_one({'name': name})
+    if document is None:
+        abort(404)
+    return jsonify(IPPool.from_document(document).summary())
+
+
+@app.route('/ip-pools/<name>/allocate', methods=['POST'])
+@requires_auth('home')
+def allocate_addresses(name):
+    """
+    Body: {"count": 20, "owner": "job-1"}. Either all requested addresses are handed out or none (409).
+    """
+    body = request.get_json(force=True) or {}
+    try:
+        count = int(body['count'])
+    except (KeyError, TypeError, ValueError):
+        abort(400, description='"count" must be an integer')
+    if count < 1:
+        abort(400, description='"count" must be at least 1')
+    if not body.get('owner'):
+        abort(400, description='"owner" is required')
+    try:
+        pool, addresses = update_pool(db, name, lambda pool: pool.allocate(count, body['owner']))
+    except PoolExhausted as e:
+        abort(409, description=str(e))
+    if pool is None:
+        abort(404)
+    return jsonify({'addresses': addresses, 'free': pool.free})
+
+
+@app.route('/ip-pools/<name>/free', methods=['POST'])
+@requires_auth('home')
+def free_addresses(name):
+    """
+    Body: {"owner": "job-1"} to free everything an owner holds, or {"addresses": ["10.111.5.7"]}. Answers with the
+    freed ranges as [first, last] pairs.
+    """
+    body = request.get_json(force=True) or {}
+    owner = body.get('owner')
+    addresses = body.get('addresses')
+    if not (owner or addresses):
+        abort(400, description='Give an "owner" or a list of "addresses" to free')
+    if not owner and not isinstance(addresses, list):
+        abort(400, description='"addresses" must be a list')
+
+    def change(pool):
+        if owner:
+            return pool.free_owner(owner)
+        return pool.free_addresses(addresses)
+    try:
+        pool, ranges = update_pool(db, name, change)
+    except ValueError as e:
+        abort(400, description=str(e))
+    if pool is None:
+        abort(404)
+    return jsonify({'ranges': ranges, 'free': pool.free})
+
+reaper.start()
 app.run(host='0.0.0.0')
@@ -0,0 +1,52 @@
+import json
+import threading
+import time
+
+import httpretty
+
+from resource_manager.async_client import AsyncResourceManagerClient
+from resource_manager.client import RequestFailureException
+
+
+@httpretty.activate
+def test_get_resources_concurrently():
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def callback(request, uri, headers):
+        with lock:
+            in_flight.append(uri)
+            peak.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(uri)
+        return 200, headers, json.dumps({'hostname': uri.rsplit('/', 1)[-1]})
+
+    with AsyncResourceManagerClient(max_concurrency=4) as client:
+        for i in range(12):
+            httpretty.register_uri(httpretty.GET, client.client.endpoint + "/host" + str(i), body=callback)
+        results = [client.get_resource('host' + str(i)) for i in range(12)]
+        found = client.gather(results, timeout=10)
+    assert [resource['hostname'] for resource in found] == ['host' + str(i) for i in range(12)]
+    assert max(peak) <= 4
+
+
+@httpretty.activate
+def test_errors_are_raised_by_get():
+    with AsyncResourceManagerClient(max_concurrency=2) as client:
+        httpretty.register_uri(httpretty.POST, client.client.endpoint, status=422)
+        result = client.create_resource('{"hostname": "host0"}')
+        try:
+            result.get(10)
+        except RequestFailureException as e:
+            assert e.response.status_code == 422
+        else:
+            raise AssertionError("create_resource should have failed")
+
+
+def test_connection_pool_matches_concurrency():
+    client = AsyncResourceManagerClient(max_concurrency=8)
+    adapter = client.client.session.get_adapter(client.client.endpoint)
+    assert adapter._pool_maxsize == 8
+    client.close()
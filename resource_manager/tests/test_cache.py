@@ -0,0 +1,43 @@
+import time
+
+from resource_manager.cache import ResponseCache
+
+
+def test_put_get():
+    cache = ResponseCache()
+    assert cache.get('url') is None
+    cache.put('url', '"etag"', '{}')
+    assert cache.get('url') == ('"etag"', '{}')
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', '1', 'a')
+    time.sleep(0.01)
+    cache.put('b', '2', 'b')
+    time.sleep(0.01)
+    cache.get('a')
+    cache.put('c', '3', 'c')
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+
+
+def test_ttl():
+    cache = ResponseCache(ttl=-1)
+    cache.put('url', '"etag"', '{}')
+    assert cache.get('url') is None
+    assert len(cache) == 0
+
+
+def test_invalidate_and_disable():
+    cache = ResponseCache()
+    cache.put('machines/host1?', '1', '{}')
+    cache.put('machines/host10?', '2', '{}')
+    cache.invalidate('machines/host1?')
+    assert cache.get('machines/host1?') is None
+    assert cache.get('machines/host10?')
+    cache.invalidate()
+    assert len(cache) == 0
+    disabled = ResponseCache(max_entries=0)
+    disabled.put('url', '1', '{}')
+    assert disabled.get('url') is None
@@ -2,7 +2,8 @@ import json
 import httpretty
 import urllib
 
-from resource_manager.client import ResourceManagerClient
+from resource_manager.client import IPPoolClient, RequestFailureException, ResourceManagerClient
+from resource_manager.query import Query
 
 
 def test_init():
@@ -85,3 +86,262 @@ def test_get_all_resources():
     response_body = "{\"_items\":[]}"
     httpretty.register_uri(httpretty.GET, url, body=response_body)
     assert isinstance(client.get_all_resources(), list)
+
+
+@httpretty.activate
+def test_claim_resources():
+    client = ResourceManagerClient()
+    response_body = '{"_items": [{"hostname": "host1", "state": "pxe"}]}'
+    httpretty.register_uri(httpretty.POST, client.endpoint + "/claim", body=response_body)
+    claimed = client.claim_resources(1, owner='tony', job_id='job-1')
+    assert claimed == [{"hostname": "host1", "state": "pxe"}]
+    request = json.loads(httpretty.last_request().body)
+    assert request['count'] == 1
+    assert request['job_id'] == 'job-1'
+    assert request['state'] == 'pxe'
+
+
+@httpretty.activate
+def test_update_resources():
+    client = ResourceManagerClient()
+    resources = [{'hostname': 'host' + str(i), '_id': 'id' + str(i), '_etag': 'etag' + str(i)} for i in range(3)]
+    for i in range(2):
+        httpretty.register_uri(httpretty.PATCH, client.endpoint + "/id" + str(i), status=200)
+    httpretty.register_uri(httpretty.PATCH, client.endpoint + "/id2", status=412)
+    result = client.update_resources(resources, {'owner': ''})
+    assert sorted(result['succeeded']) == ['host0', 'host1']
+    assert [key for key, _ in result['failed']] == ['host2']
+    patches = [request for request in httpretty.HTTPretty.latest_requests if request.method == 'PATCH']
+    assert len(patches) == 3
+    for request in patches:
+        assert json.loads(request.body) == {'owner': ''}
+        assert request.headers['If-Match'] == 'etag' + request.path[-1]
+
+
+@httpretty.activate
+def test_delete_resources():
+    client = ResourceManagerClient()
+    resources = [{'hostname': 'host0', '_id': 'id0', '_etag': 'etag0'}]
+    httpretty.register_uri(httpretty.DELETE, client.endpoint + "/id0", status=200)
+    assert client.delete_resources(resources) == {'succeeded': ['host0'], 'failed': []}
+    assert client.delete_resources([]) == {'succeeded': [], 'failed': []}
+
+
+def test_session_pool():
+    client = ResourceManagerClient(pool_size=32, timeout=5)
+    adapter = client.session.get_adapter(client.endpoint)
+    assert adapter._pool_maxsize == 32
+    assert adapter.max_retries.total == 3
+    assert client.timeout == 5
+
+
+@httpretty.activate
+def test_get_retries_server_errors():
+    client = ResourceManagerClient()
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/test_machine",
+                           responses=[httpretty.Response(body='', status=503),
+                                      httpretty.Response(body='{"_id": "my_id"}')])
+    assert client.get_resource('test_machine') == {'_id': 'my_id'}
+    assert len(httpretty.HTTPretty.latest_requests) == 2
+
+
+def _paged_server(client, resources, limit):
+    def callback(request, uri, headers):
+        where = json.loads(request.querystring['where'][0])
+        after = where.pop('_id', {}).get('$gt', '')
+        matching = [resource for resource in resources
+                    if resource['_id'] > after and all(resource.get(k) == v for k, v in where.items())]
+        page = {'_items': matching[:limit], '_links': {}}
+        if len(matching) > limit:
+            page['_links']['next'] = {'href': 'next'}
+        return 200, headers, json.dumps(page)
+    httpretty.register_uri(httpretty.GET, client.endpoint, body=callback)
+
+
+@httpretty.activate
+def test_iter_pages():
+    client = ResourceManagerClient()
+    resources = [{'hostname': 'host' + str(i), '_id': 'id' + str(i), 'owner': 'tony' if i % 2 else ''}
+                 for i in range(10)]
+    _paged_server(client, resources, limit=2)
+    pages = list(client.iter_pages(where={'owner': 'tony'}, page_size=2))
+    assert [[resource['hostname'] for resource in page] for page in pages] == \
+        [['host1', 'host3'], ['host5', 'host7'], ['host9']]
+    assert httpretty.last_request().querystring['sort'] == ['_id']
+
+
+@httpretty.activate
+def test_iter_pages_survives_updates():
+    client = ResourceManagerClient()
+    resources = [{'hostname': 'host' + str(i), '_id': 'id' + str(i), 'owner': 'tony'} for i in range(5)]
+    _paged_server(client, resources, limit=2)
+    freed = []
+    for page in client.iter_pages(where={'owner': 'tony'}, page_size=2):
+        for resource in resources:
+            if resource['_id'] in [item['_id'] for item in page]:
+                resource['owner'] = ''
+        freed.extend(item['hostname'] for item in page)
+    assert freed == ['host0', 'host1', 'host2', 'host3', 'host4']
+
+
+@httpretty.activate
+def test_iter_pages_raises_failed_prefetch():
+    client = ResourceManagerClient(retries=0)
+    resources = [{'hostname': 'host' + str(i), '_id': 'id' + str(i)} for i in range(3)]
+
+    def callback(request, uri, headers):
+        if 'id1' in request.querystring['where'][0]:
+            return 500, headers, 'boom'
+        return 200, headers, json.dumps({'_items': resources[:2], '_links': {'next': {}}})
+    httpretty.register_uri(httpretty.GET, client.endpoint, body=callback)
+    pages = client.iter_pages(page_size=2)
+    assert [item['hostname'] for item in next(pages)] == ['host0', 'host1']
+    try:
+        next(pages)
+    except RequestFailureException:
+        pass
+    else:
+        raise AssertionError('The failed page should be raised')
+
+
+@httpretty.activate
+def test_get_all_resources_unpaginated():
+    client = ResourceManagerClient()
+    httpretty.register_uri(httpretty.GET, client.endpoint, body='{"_items": [{"_id": "id0"}, {"_id": "id1"}]}')
+    assert client.get_all_resources() == [{'_id': 'id0'}, {'_id': 'id1'}]
+
+
+@httpretty.activate
+def test_projection():
+    client = ResourceManagerClient(resource_type='public-addresses')
+    httpretty.register_uri(httpretty.GET, client.endpoint, body='{"_items": []}')
+    client.find_resources('owner', 'tony', projection=['owner'])
+    projection = json.loads(httpretty.last_request().querystring['projection'][0])
+    assert projection == {'owner': 1, 'address': 1}
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/10.0.0.1", body='{"address": "10.0.0.1"}')
+    client.get_resource('10.0.0.1', projection=['owner'])
+    assert 'projection' in httpretty.last_request().querystring
+    client.get_resource('10.0.0.1')
+    assert 'projection' not in httpretty.last_request().querystring
+
+
+@httpretty.activate
+def test_iter_pages_sorted_query():
+    client = ResourceManagerClient()
+    resources = [{'hostname': 'host' + str(i), '_id': 'id' + str(i)} for i in range(5)]
+
+    def callback(request, uri, headers):
+        page = int(request.querystring.get('page', ['1'])[0])
+        page_size = int(request.querystring['max_results'][0])
+        items = list(reversed(resources))[(page - 1) * page_size:page * page_size]
+        links = {'next': {}} if page * page_size < len(resources) else {}
+        return 200, headers, json.dumps({'_items': items, '_links': links})
+    httpretty.register_uri(httpretty.GET, client.endpoint, body=callback)
+
+    query = Query(state='pxe_failed').sort('hostname', descending=True).limit(3)
+    found = [resource['hostname'] for resource in client.iter_resources(where=query, page_size=2)]
+    assert found == ['host4', 'host3', 'host2']
+    assert httpretty.last_request().querystring['sort'] == ['-hostname,_id']
+    assert json.loads(httpretty.last_request().querystring['where'][0]) == {'state': 'pxe_failed'}
+
+
+@httpretty.activate
+def test_get_revalidates_cached_response():
+    client = ResourceManagerClient()
+
+    def callback(request, uri, headers):
+        if request.headers.get('If-None-Match') == '"v1"':
+            return 304, headers, ''
+        headers['ETag'] = '"v1"'
+        return 200, headers, '{"_id": "my_id", "owner": "tony"}'
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/test_machine", body=callback)
+    assert client.get_resource('test_machine') == {'_id': 'my_id', 'owner': 'tony'}
+    assert client.get_resource('test_machine') == {'_id': 'my_id', 'owner': 'tony'}
+    assert httpretty.last_request().headers['If-None-Match'] == '"v1"'
+    assert (client.cache.hits, client.cache.misses) == (1, 1)
+
+    httpretty.register_uri(httpretty.PATCH, client.endpoint + "/my_id", body='{}')
+    client.update_resources([{'hostname': 'test_machine', '_id': 'my_id', '_etag': 'v1'}], {'owner': ''})
+    assert len(client.cache) == 0
+
+
+@httpretty.activate
+def test_compare_and_swap_retries_lost_races():
+    client = ResourceManagerClient()
+    versions = iter(['1', '2'])
+
+    def get_callback(request, uri, headers):
+        return 200, headers, json.dumps({'_id': 'my_id', '_etag': next(versions), 'state': 'idle'})
+
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/test_machine", body=get_callback)
+    httpretty.register_uri(httpretty.PATCH, client.endpoint + "/my_id",
+                           responses=[httpretty.Response(body='', status=412),
+                                      httpretty.Response(body='{"_etag": "3"}')])
+    seen = []
+
+    def claim(machine):
+        seen.append(machine['_etag'])
+        return {'state': 'pxe'} if machine['state'] == 'idle' else None
+    machine = client.compare_and_swap('test_machine', claim, backoff=0)
+    assert seen == ['1', '2']
+    assert machine['state'] == 'pxe' and machine['_etag'] == '3'
+    assert httpretty.last_request().headers['If-Match'] == '2'
+
+
+@httpretty.activate
+def test_compare_and_swap_gives_up():
+    client = ResourceManagerClient()
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/test_machine", body='{"_id": "my_id", "_etag": "1"}')
+    httpretty.register_uri(httpretty.PATCH, client.endpoint + "/my_id", status=412)
+    try:
+        client.compare_and_swap('test_machine', lambda machine: {'state': 'pxe'}, retries=2, backoff=0)
+    except RequestFailureException as e:
+        assert e.response.status_code == 412
+    else:
+        raise AssertionError("compare_and_swap should have given up")
+    assert len([request for request in httpretty.HTTPretty.latest_requests if request.method == 'PATCH']) == 3
+
+
+@httpretty.activate
+def test_count_by_state():
+    client = ResourceManagerClient()
+    httpretty.register_uri(httpretty.GET, client.endpoint + "/counts", body='{"idle": 3, "pxe": 0}')
+    assert client.count_by_state() == {'idle': 3, 'pxe': 0}
+
+
+@httpretty.activate
+def test_claim_and_renew_leases():
+    client = ResourceManagerClient()
+    httpretty.register_uri(httpretty.POST, client.endpoint + "/claim", body='{"_items": []}')
+    client.claim_resources(1, owner='tony', job_id='job-1', lease=3600)
+    assert json.loads(httpretty.last_request().body)['lease'] == 3600
+    client.claim_resources(1, owner='tony', job_id='job-1')
+    assert 'lease' not in json.loads(httpretty.last_request().body)
+
+    httpretty.register_uri(httpretty.PATCH, client.endpoint + "/id0", body='{}')
+    result = client.renew_leases([{'hostname': 'host0', '_id': 'id0', '_etag': 'etag0'}], 3600)
+    assert result['succeeded'] == ['host0']
+    assert json.loads(httpretty.last_request().body)['lease_expires'].endswith(' GMT')
+    assert client.lease_expiry(0) is None
+
+
+@httpretty.activate
+def test_ip_pool_client():
+    client = IPPoolClient('public')
+    httpretty.register_uri(httpretty.POST, client.endpoint, status=201, body='{"name": "public", "free": 254}')
+    assert client.create_pool(cidr='10.0.0.0/24')['free'] == 254
+    httpretty.register_uri(httpretty.POST, client.pool_url + "/allocate",
+                           body='{"addresses": ["10.0.0.1", "10.0.0.2"], "free": 252}')
+    assert client.allocate(2, 'job-1') == ['10.0.0.1', '10.0.0.2']
+    assert json.loads(httpretty.last_request().body) == {'count': 2, 'owner': 'job-1'}
+    httpretty.register_uri(httpretty.POST, client.pool_url + "/free",
+                           body='{"ranges": [["10.0.0.1", "10.0.0.1"]], "free": 253}')
+    assert client.free(addresses=['10.0.0.1']) == [['10.0.0.1', '10.0.0.1']]
+    assert json.loads(httpretty.last_request().body) == {'addresses': ['10.0.0.1']}
+    assert not hasattr(client, 'find_resources')
+    try:
+        client.free(owner='')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Freeing without an owner or addresses should fail')
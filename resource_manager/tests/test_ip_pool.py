@@ -0,0 +1,97 @@
+import mongomock
+
+from resource_manager.ip_pool import IPPool, PoolExhausted, PoolTooLarge, create_pool, parse_cidr, int_to_ip, \
+    update_pool
+
+
+def test_parse_cidr():
+    first, last = parse_cidr('10.111.0.0/16')
+    assert (int_to_ip(first), int_to_ip(last)) == ('10.111.0.1', '10.111.255.254')
+    first, last = parse_cidr('10.0.0.7/32')
+    assert first == last
+
+
+def test_allocate_and_free_owner():
+    pool = IPPool.from_range('public', '10.0.0.1', '10.0.0.10')
+    assert pool.allocate(3, 'job-1') == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+    assert pool.allocate(2, 'job-2') == ['10.0.0.4', '10.0.0.5']
+    assert pool.allocate(1, 'job-1') == ['10.0.0.6']
+    assert pool.owners['job-1'] == [[0, 3], [5, 1]]
+    assert pool.free == 4
+    assert pool.free_owner('job-1') == [['10.0.0.1', '10.0.0.3'], ['10.0.0.6', '10.0.0.6']]
+    assert pool.free == 8
+    assert pool.free_owner('job-1') == []
+
+
+def test_allocate_wraps_around_and_exhausts():
+    pool = IPPool.from_range('public', '10.0.0.1', '10.0.0.10')
+    pool.allocate(8, 'job-1')
+    pool.free_addresses(['10.0.0.2'])
+    assert pool.allocate(3, 'job-2') == ['10.0.0.2', '10.0.0.9', '10.0.0.10']
+    try:
+        pool.allocate(1, 'job-3')
+    except PoolExhausted:
+        pass
+    else:
+        raise AssertionError("an exhausted pool should refuse to allocate")
+    assert pool.owners['job-1'] == [[0, 1], [2, 6]]
+
+
+def test_large_pool_is_compact():
+    pool = IPPool.from_cidr('private', '10.0.0.0/16')
+    pool.allocate(65534, 'everything')
+    document = pool.to_document()
+    assert len(document['bitmap']) == 8192
+    assert document['owners'] == [{'owner': 'everything', 'runs': [[0, 65534]]}]
+    assert IPPool.from_document(document).summary()['free'] == 0
+
+
+def test_pool_size_limit():
+    assert IPPool.from_cidr('public', '10.0.0.0/24', max_size=254).size == 254
+    for build in (lambda: IPPool.from_cidr('public', '10.0.0.0/8', max_size=2 ** 20),
+                  lambda: IPPool.from_range('public', '10.0.0.1', '10.0.1.0', max_size=255)):
+        try:
+            build()
+        except PoolTooLarge:
+            pass
+        else:
+            raise AssertionError('A pool above max_size should be refused')
+
+
+def test_update_pool():
+    db = mongomock.MongoClient().db
+    assert create_pool(db, IPPool.from_cidr('public', '10.0.0.0/29'))
+    assert not create_pool(db, IPPool.from_cidr('public', '10.0.0.0/29'))
+    pool, addresses = update_pool(db, 'public', lambda pool: pool.allocate(2, 'job-1'))
+    assert addresses == ['10.0.0.1', '10.0.0.2']
+    document = db.ip_pools.find_one({'name': 'public'})
+    assert document['version'] == 1 and document['free'] == 4
+    pool, ranges = update_pool(db, 'public', lambda pool: pool.free_owner('job-1'))
+    assert ranges == [['10.0.0.1', '10.0.0.2']]
+    assert update_pool(db, 'missing', lambda pool: None) == (None, None)
+
+
+def test_free_addresses_splits_runs():
+    pool = IPPool.from_cidr('private', '10.0.0.0/16')
+    pool.allocate(1000, 'job-1')
+    freed = pool.free_addresses(['10.0.0.5', '10.0.0.6', '10.0.1.1'])
+    assert freed == [['10.0.0.5', '10.0.0.6'], ['10.0.1.1', '10.0.1.1']]
+    assert pool.owners['job-1'] == [[0, 4], [6, 250], [257, 743]]
+    assert pool.free == 65534 - 997
+    assert pool.bitmap[0] == 0b11001111
+    pool.free_owner('job-1')
+    assert pool.free == 65534
+    assert not any(pool.bitmap[:-1]) and pool.bitmap[-1] == 0b11000000
+
+
+def test_free_addresses_rejects_bad_addresses():
+    pool = IPPool.from_range('public', '10.0.0.1', '10.0.0.10')
+    pool.allocate(2, 'job-1')
+    for address in ['10.0.0.300', '10.0.0.11', 7]:
+        try:
+            pool.free_addresses(['10.0.0.1', address])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('{0!r} should be refused'.format(address))
+    assert pool.free == 8
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import mongomock
+
+from resource_manager.operations import ClaimError, claim_resources, ensure_indexes, mark_kickstarted, reap_expired
+
+
+def test_mark_kickstarted():
+    db = mongomock.MongoClient().db
+    db.machines.insert_one({'hostname': 'host1', 'state': 'pxe', 'kickstarted': False, '_etag': 'old'})
+    assert mark_kickstarted(db, 'host1')
+    machine = db.machines.find_one({'hostname': 'host1'})
+    assert machine['kickstarted'] is True
+    assert machine['_etag'] != 'old'
+
+
+def test_mark_kickstarted_unknown_host():
+    db = mongomock.MongoClient().db
+    assert not mark_kickstarted(db, 'missing')
+
+
+def _machines(db, count):
+    for i in range(count):
+        db.machines.insert_one({'hostname': 'host' + str(i), 'state': 'idle', 'owner': '', 'job_id': '',
+                                '_etag': 'etag' + str(i)})
+
+
+def test_claim_resources():
+    db = mongomock.MongoClient().db
+    _machines(db, 3)
+    updates = {'owner': 'tony', 'job_id': 'job-1', 'state': 'pxe'}
+    claimed = claim_resources(db, 'machines', 2, updates, available={'state': 'idle'})
+    assert len(claimed) == 2
+    assert all(machine['job_id'] == 'job-1' for machine in claimed)
+    assert db.machines.find({'job_id': 'job-1', 'state': 'pxe'}).count() == 2
+    assert db.machines.find({'state': 'idle'}).count() == 1
+
+
+def test_claim_resources_where():
+    db = mongomock.MongoClient().db
+    _machines(db, 3)
+    claimed = claim_resources(db, 'machines', 1, {'state': 'pxe'}, where={'hostname': 'host2'},
+                              available={'state': 'idle'})
+    assert [machine['hostname'] for machine in claimed] == ['host2']
+
+
+def test_claim_resources_rolls_back_when_short():
+    db = mongomock.MongoClient().db
+    _machines(db, 2)
+    try:
+        claim_resources(db, 'machines', 3, {'state': 'pxe', 'job_id': 'job-1'}, available={'state': 'idle'})
+    except ClaimError:
+        pass
+    else:
+        raise AssertionError('Claim of more machines than available should fail')
+    assert db.machines.find({'state': 'idle', 'job_id': ''}).count() == 2
+    assert sorted(machine['_etag'] for machine in db.machines.find()) == ['etag0', 'etag1']
+
+
+def test_claim_resources_partial():
+    db = mongomock.MongoClient().db
+    _machines(db, 2)
+    claimed = claim_resources(db, 'machines', 3, {'state': 'pxe'}, available={'state': 'idle'}, partial=True)
+    assert len(claimed) == 2
+
+
+def test_ensure_indexes():
+    db = mongomock.MongoClient().db
+    indexes = {'machines': {'hostname': ([('hostname', 1)], {'unique': True}),
+                            'state_owner': [('state', 1), ('owner', 1)]}}
+    created = ensure_indexes(db, indexes)
+    assert sorted(created) == [('machines', 'hostname'), ('machines', 'state_owner')]
+    info = db.machines.index_information()
+    assert info['hostname']['unique']
+    assert ensure_indexes(db, indexes) == []
+    indexes['machines']['state_owner'] = [('state', 1)]
+    assert ensure_indexes(db, indexes) == [('machines', 'state_owner')]
+
+
+def test_reap_expired():
+    db = mongomock.MongoClient().db
+    now = datetime(2014, 6, 3, 12, 0)
+    db.machines.insert_one({'hostname': 'expired', 'state': 'in_use', 'owner': 'tony', 'job_id': 'job-1',
+                            'lease_expires': now - timedelta(minutes=1), '_etag': 'old'})
+    db.machines.insert_one({'hostname': 'leased', 'state': 'in_use', 'owner': 'tony', 'job_id': 'job-1',
+                            'lease_expires': now + timedelta(minutes=1), '_etag': 'old'})
+    db.machines.insert_one({'hostname': 'forever', 'state': 'in_use', 'owner': 'tony', 'lease_expires': None})
+    reset = {'state': 'idle', 'owner': '', 'job_id': ''}
+    assert reap_expired(db, 'machines', reset, now=now) == 1
+    expired = db.machines.find_one({'hostname': 'expired'})
+    assert expired['state'] == 'idle' and expired['owner'] == ''
+    assert 'lease_expires' not in expired
+    assert expired['_etag'] != 'old' and 'state_changed' in expired
+    assert db.machines.find_one({'hostname': 'leased'})['owner'] == 'tony'
+    assert db.machines.find_one({'hostname': 'forever'})['owner'] == 'tony'
+    assert reap_expired(db, 'machines', reset, now=now) == 0
+
+
+def test_reap_expired_leaves_machines_needing_repair():
+    db = mongomock.MongoClient().db
+    now = datetime(2014, 6, 3, 12, 0)
+    db.machines.insert_one({'hostname': 'broken', 'state': 'needs_repair', 'owner': 'tony',
+                            'lease_expires': now - timedelta(minutes=1)})
+    assert reap_expired(db, 'machines', {'state': 'idle', 'owner': ''}, now=now) == 0
+    broken = db.machines.find_one({'hostname': 'broken'})
+    assert broken['state'] == 'needs_repair' and broken['owner'] == 'tony'
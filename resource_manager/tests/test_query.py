@@ -0,0 +1,33 @@
+import json
+from datetime import datetime
+
+from resource_manager.query import Query
+
+
+def test_equals():
+    query = Query(state='idle', owner='')
+    assert json.loads(query.compile()) == {'state': 'idle', 'owner': ''}
+    assert query.compile_sort() == '_id'
+
+
+def test_operators():
+    query = Query().is_in('state', ['pxe', 'pxe_failed']).not_equal('owner', '').not_in('job_id', ['a', 'b'])
+    assert json.loads(query.compile()) == {'state': {'$in': ['pxe', 'pxe_failed']}, 'owner': {'$ne': ''},
+                                           'job_id': {'$nin': ['a', 'b']}}
+
+
+def test_conditions_on_one_field_combine():
+    query = Query(owner='tony').not_equal('owner', 'vic').range('count', gte=1, lt=5)
+    assert json.loads(query.compile()) == {'owner': {'$eq': 'tony', '$ne': 'vic'}, 'count': {'$gte': 1, '$lt': 5}}
+
+
+def test_updated_range_uses_eve_dates():
+    query = Query(state='pxe_failed').updated_before(datetime(2014, 6, 3, 10, 30))
+    assert json.loads(query.compile()) == {'state': 'pxe_failed', '_updated': {'$lt': 'Tue, 03 Jun 2014 10:30:00 GMT'}}
+
+
+def test_sort_limit_and_after():
+    query = Query().sort('_updated', descending=True).sort('hostname').limit(10)
+    assert query.compile_sort() == '-_updated,hostname,_id'
+    assert query.max_results == 10
+    assert json.loads(query.compile(after='abc')) == {'_id': {'$gt': 'abc'}}
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import mongomock
+
+from resource_manager.reaper import LeaseReaper
+
+
+def test_run_once():
+    db = mongomock.MongoClient().db
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    db.machines.insert_one({'hostname': 'host0', 'state': 'in_use', 'owner': 'tony', 'lease_expires': expired})
+    db['public-addresses'].insert_one({'address': '10.0.0.1', 'owner': 'job-1', 'lease_expires': expired})
+    db['public-addresses'].insert_one({'address': '10.0.0.2', 'owner': 'job-1', 'lease_expires': expired})
+    reaped = []
+    reaper = LeaseReaper(db, {'machines': {'state': 'idle', 'owner': ''}, 'public-addresses': {'owner': ''}},
+                         on_reap=lambda collection, count: reaped.append((collection, count)))
+    assert reaper.run_once() == {'machines': 1, 'public-addresses': 2}
+    assert sorted(reaped) == [('machines', 1), ('public-addresses', 2)]
+    reaper.run_once()
+    metrics = reaper.metrics()
+    assert metrics['cycles'] == 2
+    assert metrics['errors'] == 0
+    assert metrics['reclaimed'] == {'machines': 1, 'public-addresses': 2}
+    assert db['public-addresses'].find_one({'address': '10.0.0.1'})['owner'] == ''
+
+
+def test_start_stop():
+    reaper = LeaseReaper(mongomock.MongoClient().db, {'machines': {'owner': ''}}, interval=0.01)
+    reaper.start()
+    reaper.stop()
+    assert not reaper._thread.is_alive()
+
+
+def test_failing_callback_is_counted():
+    db = mongomock.MongoClient().db
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    db.machines.insert_one({'hostname': 'host0', 'state': 'in_use', 'owner': 'tony', 'lease_expires': expired})
+
+    def on_reap(collection, count):
+        raise RuntimeError('recount failed')
+    reaper = LeaseReaper(db, {'machines': {'state': 'idle', 'owner': ''}}, on_reap=on_reap)
+    assert reaper.run_once() == {'machines': 1}
+    metrics = reaper.metrics()
+    assert metrics['errors'] == 1
+    assert metrics['cycles'] == 1
+    assert metrics['reclaimed'] == {'machines': 1}
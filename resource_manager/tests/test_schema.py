@@ -1,9 +1,11 @@
 from resource_manager.api_config import ResourceSchema
-from resource_manager.api_config import PAGINATION, RESOURCE_METHODS, ITEM_METHODS, lookup_url
+from resource_manager.api_config import PAGINATION, PAGINATION_DEFAULT, PAGINATION_LIMIT
+from resource_manager.api_config import RESOURCE_METHODS, ITEM_METHODS, lookup_url
 
 
 def test_load():
-    assert PAGINATION is False
+    assert PAGINATION is True
+    assert PAGINATION_DEFAULT <= PAGINATION_LIMIT
     assert RESOURCE_METHODS == ['GET', 'POST', 'DELETE']
     assert ['GET', 'PATCH', 'PUT', 'DELETE'] == ITEM_METHODS
     assert lookup_url == 'regex("[\.\w-]+")'
@@ -15,6 +17,7 @@ def test_machine_keys():
     assert 'owner' in schema
     assert 'state' in schema
     assert 'job_id' in schema
+    assert 'kickstarted' in schema
 
 
 def test_machine_required():
@@ -62,3 +65,26 @@ def test_domains():
     domain_check(schema.machines, "machine")
     domain_check(schema.private_addresses, "private-address")
     domain_check(schema.public_addresses, "public-address")
+
+
+def test_indexes():
+    schema = ResourceSchema()
+    assert schema.machines['mongo_indexes']['hostname'] == ([('hostname', 1)], {'unique': True})
+    assert schema.machines['mongo_indexes']['state_owner'] == [('state', 1), ('owner', 1)]
+    for field in ['owner', 'job_id']:
+        assert schema.machines['mongo_indexes'][field] == [(field, 1)]
+    for domain in [schema.public_addresses, schema.private_addresses]:
+        assert domain['mongo_indexes']['address'] == ([('address', 1)], {'unique': True})
+        assert domain['mongo_indexes']['owner'] == [('owner', 1)]
+
+
+def test_machine_state_changed():
+    schema = ResourceSchema().machine_schema
+    assert schema['state_changed']['type'] == 'datetime'
+
+
+def test_lease_fields():
+    schema = ResourceSchema()
+    for domain in [schema.machines, schema.public_addresses, schema.private_addresses]:
+        assert domain['schema']['lease_expires']['type'] == 'datetime'
+        assert domain['mongo_indexes']['lease_expires'] == ([('lease_expires', 1)], {'sparse': True})
@@ -0,0 +1,46 @@
+import mongomock
+
+from resource_manager.api_config import ResourceSchema
+from resource_manager.transitions import TRANSITIONS, StateCounter, TransitionError, check_transition, stamp_transition
+
+
+def test_transitions_cover_schema_states():
+    states = ResourceSchema.machine_schema['state']['allowed']
+    assert sorted(TRANSITIONS) == sorted(states)
+    for targets in TRANSITIONS.values():
+        assert set(targets) <= set(states)
+
+
+def test_check_transition():
+    check_transition('idle', 'pxe')
+    check_transition('needs_repair', 'needs_repair')
+    check_transition(None, 'in_use')
+    try:
+        check_transition('needs_repair', 'in_use')
+    except TransitionError:
+        pass
+    else:
+        raise AssertionError("needs_repair -> in_use should be rejected")
+
+
+def test_stamp_transition():
+    updates = {'state': 'pxe'}
+    stamp_transition(updates, {'state': 'idle'})
+    assert 'state_changed' in updates
+    updates = {'owner': 'tony'}
+    stamp_transition(updates, {'state': 'idle'})
+    assert 'state_changed' not in updates
+
+
+def test_state_counter():
+    db = mongomock.MongoClient().db
+    for state in ['idle', 'idle', 'in_use']:
+        db.machines.insert_one({'state': state})
+    counter = StateCounter()
+    counter.load(db)
+    assert counter.counts() == {'idle': 2, 'in_use': 1}
+    counter.move('idle', 'pxe', 2)
+    counter.add('needs_repair')
+    counter.remove('in_use')
+    assert counter.counts() == {'pxe': 2, 'needs_repair': 1}
+    assert counter.count('idle') == 0
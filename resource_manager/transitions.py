@@ -0,0 +1,88 @@
+import threading
+from datetime import datetime
+
+# state -> states a machine may move to from it. Staying in the same state is always allowed.
+TRANSITIONS = {
+    'idle': ['pxe', 'in_use', 'needs_repair'],
+    'pxe': ['in_use', 'pxe_failed', 'idle', 'needs_repair'],
+    'pxe_failed': ['pxe', 'idle', 'needs_repair'],
+    'in_use': ['idle', 'needs_repair'],
+    'needs_repair': ['idle']
+}
+
+# States a machine only holds under a lease. Machines moved out of them, e.g. to needs_repair, are left alone by
+# the reaper even if a stale lease_expires is still set.
+LEASED_STATES = ['pxe', 'pxe_failed', 'in_use']
+
+
+class TransitionError(Exception):
+    pass
+
+
+def check_transition(old_state, new_state):
+    """
+    :raises TransitionError: if a machine may not move from old_state to new_state
+    """
+    if old_state == new_state or old_state is None:
+        return
+    if new_state not in TRANSITIONS.get(old_state, []):
+        raise TransitionError('Machine state cannot change from "{0}" to "{1}"'.format(old_state, new_state))
+
+
+def stamp_transition(updates, original):
+    """
+    Validate a state change about to be written and record when it happened.
+
+    :param updates: (dict) fields being written, gets 'state_changed' added when the state changes
+    :param original: (dict) the document as stored
+    :raises TransitionError: if the state change is not allowed
+    """
+    new_state = updates.get('state')
+    old_state = original.get('state')
+    if new_state is None or new_state == old_state:
+        return
+    check_transition(old_state, new_state)
+    updates['state_changed'] = datetime.utcnow().replace(microsecond=0)
+
+
+class StateCounter(object):
+    def __init__(self):
+        """
+        In-memory count of machines per state, kept up to date by the server as documents are written so that
+        capacity questions ("how many are idle?") need no query.
+        """
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def load(self, db, collection='machines'):
+        """
+        Recount from the database, e.g. at startup or after a bulk change made outside the API.
+        """
+        counts = {}
+        for group in db[collection].aggregate([{'$group': {'_id': '$state', 'count': {'$sum': 1}}}]):
+            counts[group['_id']] = group['count']
+        with self._lock:
+            self._counts = counts
+
+    def move(self, old_state, new_state, count=1):
+        if old_state == new_state:
+            return
+        with self._lock:
+            if old_state is not None:
+                self._counts[old_state] = self._counts.get(old_state, 0) - count
+            if new_state is not None:
+                self._counts[new_state] = self._counts.get(new_state, 0) + count
+
+    def add(self, state, count=1):
+        self.move(None, state, count)
+
+    def remove(self, state, count=1):
+        self.move(state, None, count)
+
+    def count(self, state):
+        with self._lock:
+            return self._counts.get(state, 0)
+
+    def counts(self):
+        with self._lock:
+            return dict((state, count) for state, count in self._counts.items() if count)
@@ -25,8 +25,8 @@ setup(name='deploymentmanager',
       url='https://github.com/eucalyptus/DeploymentManager.git',
       license='Apache License 2.0',
       packages=find_packages(),
-      install_requires=['paramiko', 'PrettyTable', 'eve', 'requests', 'mock', 'pep8',
-                        'Flask-Bootstrap', 'eve', 'PrettyTable', 'argparse', 'nose', 'httpretty'],
+      install_requires=['paramiko>=2.1', 'PrettyTable', 'eve', 'requests', 'mock', 'pep8',
+                        'Flask-Bootstrap', 'eve', 'PrettyTable', 'argparse', 'nose', 'httpretty', 'mongomock'],
       test_suite="nose.collector",
       zip_safe=False,
       classifiers=["Development Status :: 1 - Alpha",